@@ -1,131 +1,313 @@
-import argparse
-import socket
-import ssl
-import json
-import threading
-import logging
-import zmq
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-
-class GameClient:
-    def __init__(self, server_host='127.0.0.1', server_port=65432, zmq_pub_port=5557, cafile=None):
-        # Initialize client with SSL context and ZeroMQ subscriber socket
-        self.listen_thread = None
-        self.receive_thread = None
-        self.server_host = server_host
-        self.server_port = server_port
-        self.zmq_pub_port = zmq_pub_port
-        self.cafile = cafile
-        self.context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.cafile)
-        self.context.check_hostname = False
-        self.context.verify_mode = ssl.CERT_REQUIRED
-        self.client_socket = None
-        self.zmq_context = zmq.Context()
-        self.mode = None
-        self.mode_selected = False
-        self.stop_event = threading.Event()
-
-    def start(self):
-        # Start the SSL client and connect to the server
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                self.client_socket = self.context.wrap_socket(sock, server_hostname=self.server_host)
-                self.client_socket.connect((self.server_host, self.server_port))
-                logging.info("SSL connection established with server.")
-                self.receive_thread = threading.Thread(target=self.receive_messages)
-                self.receive_thread.start()
-                self.send_messages()
-        except ssl.SSLError as e:
-            logging.error(f"SSL error: {e}")
-        except Exception as e:
-            logging.error(f"Connection error: {e}")
-
-    def listen_for_broadcasts(self):
-        # Listen for broadcast messages from the server
-        sub_socket = self.zmq_context.socket(zmq.SUB)
-        sub_socket.connect(f"tcp://localhost:{self.zmq_pub_port}")
-        sub_socket.setsockopt_string(zmq.SUBSCRIBE, '')
-        while not self.stop_event.is_set():
-            try:
-                message = sub_socket.recv_string(flags=zmq.NOBLOCK)
-                logging.info(f"Broadcast message received: {message}")
-            except zmq.Again:
-                pass
-
-    def receive_messages(self):
-        # Receive messages from the server and print them to the console
-        while not self.stop_event.is_set():
-            try:
-                response = self.client_socket.recv(1024).decode('utf-8')
-                if not response:
-                    break
-                response_json = json.loads(response)
-                print("Server:", response_json['message'])
-
-                if "Choose game mode" in response_json['message']:
-                    self.mode_selected = False
-                elif "Multi player game started" in response_json['message']:
-                    self.mode_selected = True
-                    self.mode = '2'
-                    self.listen_thread = threading.Thread(target=self.listen_for_broadcasts)
-                    self.listen_thread.start()
-                elif "Exiting" in response_json['message']:
-                    self.mode_selected = False
-                else:
-                    self.mode_selected = True
-
-            except Exception as e:
-                logging.error(f"Error receiving message: {e}")
-                break
-
-    def send_messages(self):
-        # Send user input messages to the server
-        while True:
-            try:
-                message = input()
-                if message.lower() == 'exit':
-                    if not self.mode_selected:
-                        message_json = json.dumps({"mode": "exit"})
-                        self.client_socket.sendall(message_json.encode('utf-8'))
-                        break  # Exit the loop and close the connection
-                    else:
-                        message_json = json.dumps({"exit": "exit"})
-                        self.client_socket.sendall(message_json.encode('utf-8'))
-                        self.mode_selected = False  # Reset the mode selection to allow main menu interaction
-                        continue  # Continue the loop to return to main menu
-                elif not self.mode_selected:
-                    message_json = json.dumps({"mode": message})
-                else:
-                    message_json = json.dumps({"guess": message})
-
-                self.client_socket.sendall(message_json.encode('utf-8'))
-
-            except Exception as e:
-                logging.error(f"Error sending message: {e}")
-                break
-        self.shutdown_connection()  # Ensure the connection is properly closed
-
-    def shutdown_connection(self):
-        # Shutdown the client connection and cleanup
-        self.stop_event.set()
-        self.receive_thread.join()
-        try:
-            self.client_socket.shutdown(socket.SHUT_RDWR)
-        except Exception as e:
-            logging.error(f"Error shutting down socket: {e}")
-        finally:
-            self.client_socket.close()
-            logging.info("Connection closed.")
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Connect to the number guessing game server.')
-    parser.add_argument('-a', metavar='cafile', default=None)
-    args = parser.parse_args()
-    client = GameClient('127.0.0.1', 65432, 5557, args.a)
-    try:
-        client.start()
-    except Exception as e:
-        logging.error(f"Client error: {e}")
+import argparse
+import json
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+import logging
+import zmq
+from fanout import room_topic
+from framing import BINARY_CODEC, JSON_CODEC, MessageStream
+from strategies import make_strategy
+from tls_sessions import SessionCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# How long to wait for the "sync" event that shows the room subscription is live, and how often to ask for it
+SYNC_INTERVAL_MS = 500
+SYNC_ATTEMPTS = 10
+
+
+class GameClient:
+    def __init__(self, server_host='127.0.0.1', server_port=65432, zmq_pub_port=5557, cafile=None,
+                 codec=JSON_CODEC, session_cache=None, strategy=None, games=1):
+        # Initialize client with SSL context and ZeroMQ subscriber socket
+        self.server_host = server_host
+        self.server_port = server_port
+        self.zmq_pub_port = zmq_pub_port
+        self.cafile = cafile
+        self.codec = codec
+        self.context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.cafile)
+        self.context.check_hostname = False
+        self.context.verify_mode = ssl.CERT_REQUIRED
+        self.client_socket = None
+        # TLS sessions kept across start() calls, so reconnecting resumes instead of doing a full handshake
+        self.session_cache = session_cache or SessionCache()
+        self.stream = None
+        self.zmq_context = zmq.Context()
+        self.mode = None
+        self.mode_selected = False
+        self.room = None
+        self.name = None
+        self.sub_socket = None
+        # Until the room subscription is known to be live, announcements come over the connection (see sync())
+        self.subscription_live = False
+        self.sync_attempts = 0
+        self.sync_due = 0
+        self.input_socket = None
+        self.input_buffer = ''
+        # Headless mode: with a strategy (see strategies.py) the client plays `games` single player games by itself
+        self.strategy = strategy
+        self.games = games
+        self.games_left = games
+
+    def start(self):
+        # Start the SSL client and connect to the server
+        try:
+            session = self.session_cache.get(self.server_host, self.server_port, self.context)
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                self.client_socket = self.context.wrap_socket(sock, server_hostname=self.server_host, session=session)
+                self.client_socket.connect((self.server_host, self.server_port))
+                self.stream = MessageStream(self.client_socket)
+                # How the server names this client in room events
+                self.name = "{}:{}".format(*self.client_socket.getsockname()[:2])
+                resumed = " (resumed TLS session)" if self.client_socket.session_reused else ""
+                logging.info(f"SSL connection established with server{resumed}.")
+                self.run()
+        except ssl.SSLError as e:
+            logging.error(f"SSL error: {e}")
+        except Exception as e:
+            logging.error(f"Connection error: {e}")
+
+    def run(self):
+        # One I/O loop for the TLS connection, the room events SUB socket and the keyboard.
+        # poll() sleeps until one of them has something, so an idle client uses no CPU.
+        # Plain file descriptors come back from poll() as ints, ZeroMQ sockets as themselves
+        poller = zmq.Poller()
+        connection = self.client_socket.fileno()
+        poller.register(connection, zmq.POLLIN)
+        poller.register(self.subscriber(), zmq.POLLIN)
+        if self.strategy is None:
+            poller.register(self.open_input(), zmq.POLLIN)
+        self.games_left = self.games
+        running = True
+        while running:
+            timeout = max(0, self.sync_due - time.monotonic()) * 1000 if self.syncing() else None
+            events = poller.poll(timeout)
+            if self.syncing() and time.monotonic() >= self.sync_due:
+                self.sync()
+            for source, _ in events:
+                try:
+                    if source == connection:
+                        running = self.receive_messages()
+                    elif source is self.sub_socket:
+                        self.receive_events()
+                    else:
+                        running = self.read_input(source)
+                except Exception as e:
+                    logging.error(f"Error handling message: {e}")
+                    running = False
+                if not running:
+                    break
+        self.shutdown_connection()  # Ensure the connection is properly closed
+
+    def subscriber(self):
+        # The SUB socket is created and connected once, and only its subscription changes with the room
+        if self.sub_socket is None:
+            self.sub_socket = self.zmq_context.socket(zmq.SUB)
+            self.sub_socket.connect(f"tcp://{self.server_host}:{self.zmq_pub_port}")
+        return self.sub_socket
+
+    def join_room(self, room):
+        self.leave_room()
+        self.room = room
+        if room:
+            self.subscriber().setsockopt(zmq.SUBSCRIBE, room_topic(room))
+            self.sync()
+
+    def leave_room(self):
+        if self.room:
+            self.subscriber().setsockopt(zmq.UNSUBSCRIBE, room_topic(self.room))
+        self.room = None
+        self.subscription_live = False
+        self.sync_attempts = 0
+        self.sync_due = 0
+
+    def syncing(self):
+        return self.room is not None and not self.subscription_live and self.sync_attempts <= SYNC_ATTEMPTS
+
+    def sync(self):
+        # A subscription takes effect some time after it is made, and not at all if the PUB socket can't be
+        # reached. So ask the server for a "sync" event on the room's topic, again every SYNC_INTERVAL_MS until
+        # it arrives; the server keeps sending announcements over the connection until we confirm it has.
+        self.sync_attempts += 1
+        if self.sync_attempts > SYNC_ATTEMPTS:
+            logging.warning("No room events received; announcements keep coming over the connection.")
+            return
+        self.sync_due = time.monotonic() + SYNC_INTERVAL_MS / 1000
+        self.stream.send({"subscribe": self.room})
+
+    def open_input(self):
+        # The keyboard as something the poller can wait on. Windows can't poll the console, so there a thread
+        # reads the lines and passes them on over an inproc ZeroMQ socket.
+        if sys.platform != 'win32':
+            return sys.stdin.fileno()
+        if self.input_socket is None:
+            address = f"inproc://input-{id(self)}"
+            self.input_socket = self.zmq_context.socket(zmq.PAIR)
+            self.input_socket.bind(address)
+            threading.Thread(target=self.forward_input, args=(address,), daemon=True).start()
+        return self.input_socket
+
+    def forward_input(self, address):
+        # Windows only: hand every line typed to the I/O loop, then '' at end of input
+        sender = self.zmq_context.socket(zmq.PAIR)
+        sender.connect(address)
+        for line in sys.stdin:
+            sender.send_string(line)
+        sender.send_string('')
+
+    def read_input(self, source):
+        # The keyboard has input: send every complete line. Returns False when the client should stop.
+        if isinstance(source, int):
+            data = os.read(source, 4096).decode('utf-8', errors='replace')
+        else:
+            data = source.recv_string()
+        if not data:
+            # End of input (e.g. Ctrl-D) is the same as typing 'exit'
+            self.handle_input('exit')
+            return False
+        self.input_buffer += data
+        *lines, self.input_buffer = self.input_buffer.split('\n')
+        for line in lines:
+            if not self.handle_input(line.rstrip('\r')):
+                return False
+        return True
+
+    def receive_messages(self):
+        # The connection is readable: take in what has arrived and handle every complete message.
+        # OpenSSL may hold more decrypted data than one recv returns, so read until its buffer is empty.
+        while True:
+            data = self.client_socket.recv(65536)
+            if not data:
+                logging.info("Server closed the connection.")
+                return False
+            self.stream.decoder.feed(data)
+            if not self.client_socket.pending():
+                break
+        for response_json in self.stream.decoder.messages():
+            self.show_message(response_json)
+            if self.strategy is not None and not self.bot_move(response_json['message']):
+                return False
+        return True
+
+    def receive_events(self):
+        # Take every queued room event; events still queued for a room we have just left are ignored
+        while True:
+            try:
+                topic, payload = self.sub_socket.recv_multipart(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            event = json.loads(payload)
+            if event.get('room') != self.room:
+                continue
+            if event['event'] == 'sync':
+                if event.get('player') == self.name and not self.subscription_live:
+                    self.subscription_live = True
+                    self.stream.send({"subscribed": self.room})
+            elif self.subscription_live or 'message' not in event:
+                self.show_event(event)
+
+    def show_event(self, event):
+        # Room announcements arrive here instead of over the TLS connection. Our own win (or the guess that
+        # ended the round) was already answered over the connection, so it isn't printed twice.
+        if event.get('player') == self.name and event['event'] in ('winner', 'reset', 'join', 'leave'):
+            return
+        if 'message' in event:
+            print("Server:", event['message'])
+        elif event['event'] in ('join', 'leave'):
+            action = "joined" if event['event'] == 'join' else "left"
+            print(f"Room {event['room']}: {event['player']} {action} ({event['players']} players)")
+
+    def show_message(self, response_json):
+        # Print a message from the server and follow the game mode it puts us in
+        print("Server:", response_json['message'])
+        if 'room' in response_json:
+            print("Room:", response_json['room'])
+        # Switch to the binary codec once the server has answered with it
+        if self.codec == BINARY_CODEC and self.stream.peer_codec == BINARY_CODEC:
+            self.stream.codec = BINARY_CODEC
+
+        if "Choose game mode" in response_json['message']:
+            self.mode_selected = False
+            self.leave_room()
+        elif "Multi player game started" in response_json['message']:
+            self.mode_selected = True
+            self.mode = '2'
+            self.join_room(response_json.get('room'))
+        elif "Exiting" in response_json['message']:
+            self.mode_selected = False
+        else:
+            self.mode_selected = True
+
+    def bot_move(self, message):
+        # Headless play: answer the server like a player at the keyboard would. Returns False when done.
+        if "Choose game mode" in message:
+            if self.games_left <= 0:
+                return self.handle_input('exit')
+            self.games_left -= 1
+            self.strategy.reset()
+            return self.handle_input('1')
+        if message.startswith("Congratulations") or "Sorry" in message:
+            return True  # Game over, the mode prompt comes next
+        self.strategy.feedback(message)
+        guess = self.strategy.next_guess()
+        print("Your guess:", guess)
+        return self.handle_input(str(guess))
+
+    def handle_input(self, message):
+        # Send one line the user typed to the server. Returns False when the client should stop.
+        if message.lower() == 'exit':
+            if not self.mode_selected:
+                self.stream.send({"mode": "exit"})
+                return False  # Exit the loop and close the connection
+            self.stream.send({"exit": "exit"})
+            self.mode_selected = False  # Reset the mode selection to allow main menu interaction
+            return True  # Continue the loop to return to main menu
+        elif not self.mode_selected:
+            # "2 <room>" joins (or creates) a named multiplayer room instead of the first one with space
+            mode, _, room = message.partition(' ')
+            message_json = {"mode": mode}
+            if mode == '2':
+                if room.strip():
+                    message_json["room"] = room.strip()
+            # Ask for the binary codec until the server has switched to it
+            if self.codec != JSON_CODEC and self.stream.codec == JSON_CODEC:
+                message_json["codec"] = self.codec
+        else:
+            message_json = {"guess": message}
+
+        self.stream.send(message_json)
+        return True
+
+    def shutdown_connection(self):
+        # Shutdown the client connection and cleanup
+        self.leave_room()
+        # The session ticket has arrived by now, keep it for the next start()
+        self.session_cache.put(self.server_host, self.server_port, self.context, self.client_socket.session)
+        try:
+            self.client_socket.shutdown(socket.SHUT_RDWR)
+        except Exception as e:
+            logging.error(f"Error shutting down socket: {e}")
+        finally:
+            self.client_socket.close()
+            logging.info("Connection closed.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Connect to the number guessing game server.')
+    parser.add_argument('-a', metavar='cafile', default=None)
+    # Using --codec option to ask the server for the compact binary codec
+    parser.add_argument('--codec', choices=[JSON_CODEC, BINARY_CODEC], default=JSON_CODEC)
+    # Using --bot and --games options to play N single player games headless with a strategy
+    parser.add_argument('--bot', choices=['binary', 'random'], default=None)
+    parser.add_argument('--games', metavar='N', type=int, default=1)
+    args = parser.parse_args()
+    bot = make_strategy(args.bot) if args.bot else None
+    client = GameClient('127.0.0.1', 65432, 5557, args.a, args.codec, strategy=bot, games=args.games)
+    try:
+        client.start()
+    except Exception as e:
+        logging.error(f"Client error: {e}")
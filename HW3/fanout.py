@@ -0,0 +1,135 @@
+import collections
+import logging
+import socket
+import threading
+
+# What to do with a client whose outbound queue is full when a broadcast arrives:
+# 'drop' skips the broadcast for that client, 'disconnect' closes the client.
+DROP = 'drop'
+DISCONNECT = 'disconnect'
+SLOW_CONSUMER_POLICIES = (DROP, DISCONNECT)
+
+
+# Function to get the PUB/SUB topic of a room's events. Events are sent as two frames, [topic, JSON event], and
+# the topic ends with '/' so subscribing to "room/a/" doesn't also match "room/ab/".
+def room_topic(room_name):
+    return f"room/{room_name}/".encode('utf-8')
+
+
+class OutboundQueue:
+    def __init__(self, stream, max_bytes=256 * 1024):
+        # Bounded queue of encoded frames for one client, drained by that client's writer thread (run()).
+        # Senders only append to it, so a stalled TCP window blocks the writer and never the sender.
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.frames = collections.deque()
+        self.size = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, frame, block=True):
+        # Queue one frame. block=True waits for room (replies to the client's own requests), block=False returns
+        # False instead when the queue is full (broadcasts, so one slow client can't hold up the rest).
+        with self.condition:
+            while block and self.size >= self.max_bytes and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                raise ConnectionError("Connection is closed.")
+            if not block and self.size + len(frame) > self.max_bytes:
+                return False
+            self.frames.append(frame)
+            self.size += len(frame)
+            self.condition.notify_all()
+            return True
+
+    def run(self):
+        # Writer loop: send everything queued in one write, until close() is called and the queue is empty
+        while True:
+            with self.condition:
+                while not self.frames and not self.closed:
+                    self.condition.wait()
+                if not self.frames:
+                    return
+                data = b''.join(self.frames)
+                self.frames.clear()
+                self.size = 0
+                self.condition.notify_all()
+            try:
+                self.stream.send_all(data)
+            except OSError as e:
+                logging.error(f"Error sending message to client: {e}")
+                self.abort()
+                return
+
+    def close(self):
+        # Stop accepting frames; the writer still sends what is already queued
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def abort(self):
+        # Drop whatever is queued and shut the socket down, which also wakes the reader blocked in recv
+        with self.condition:
+            self.closed = True
+            self.frames.clear()
+            self.size = 0
+            self.condition.notify_all()
+        try:
+            self.stream.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def depth(self):
+        return self.size
+
+
+class FanoutStats:
+    def __init__(self, report_every=1000):
+        # Counters of the broadcast subsystem: how much was fanned out and how often clients couldn't keep up
+        self.report_every = report_every
+        self.broadcasts = 0
+        self.frames = 0
+        self.dropped = 0
+        self.disconnected = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self.lock = threading.Lock()
+
+    def record(self, frames, depth):
+        # Count one broadcast of `frames` frames; depth is the deepest recipient queue after it, in bytes
+        with self.lock:
+            self.broadcasts += 1
+            self.frames += frames
+            self.depth_total += depth
+            self.max_depth = max(self.max_depth, depth)
+            report = self.report_every and self.broadcasts % self.report_every == 0
+        if report:
+            logging.info(f"Broadcasts: {self.summary()}")
+
+    def slow_consumer(self, policy):
+        with self.lock:
+            if policy == DISCONNECT:
+                self.disconnected += 1
+            else:
+                self.dropped += 1
+            count = self.dropped + self.disconnected
+        # Log the first slow consumer and then every 100th, so a stuck client can't flood the log
+        if count % 100 == 1:
+            logging.warning(f"Slow consumer ({policy}): {self.summary()}")
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'broadcasts': self.broadcasts,
+                'frames': self.frames,
+                'dropped': self.dropped,
+                'disconnected': self.disconnected,
+                'avg_depth': round(self.depth_total / self.broadcasts) if self.broadcasts else 0,
+                'max_depth': self.max_depth,
+            }
+
+    def summary(self):
+        stats = self.snapshot()
+        return (f"{stats['broadcasts']} broadcasts, {stats['frames']} frames, {stats['dropped']} dropped, "
+                f"{stats['disconnected']} disconnected, queue depth avg {stats['avg_depth']} / "
+                f"max {stats['max_depth']} bytes")
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import struct
+import threading
+
+# Every message is a JSON object sent as a 4 byte big-endian length followed by the encoded payload.
+# The length prefix keeps messages intact when TCP/TLS merges or splits them.
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 1 << 20
+
+# Payload codecs. JSON is always understood; the compact binary codec is used only after the client asks for it
+# with a "codec" key in its first message ("start" or mode message) and the server answers in binary.
+JSON_CODEC = 'json'
+BINARY_CODEC = 'binary'
+CODECS = (JSON_CODEC, BINARY_CODEC)
+
+# Binary payloads start with one of these opcodes. JSON payloads always start with '{',
+# so the receiver can tell the two apart frame by frame.
+OP_MESSAGE_CODE = 0x01  # server message from MESSAGE_CODES, 1 byte code
+OP_MESSAGE_TEXT = 0x02  # any other server message, UTF-8 text
+OP_GUESS = 0x03  # guess that is a small integer, signed 16 bit
+OP_MODE = 0x04  # mode selection, UTF-8 text
+OP_EXIT = 0x05  # leave the current game
+JSON_START = ord('{')
+GUESS_FORMAT = struct.Struct('>h')
+
+# Server messages that are sent as a 1 byte code and rendered by the client from this table.
+# The codes are part of the wire protocol: only ever append to this tuple.
+MESSAGE_CODES = (
+    "Guess a number between 1 to 10:",
+    "Congratulations, you did it!",
+    "Hint: You guessed too small! Guess again: ",
+    "Hint: You guessed too high! Guess again: ",
+    "Sorry, you've used all of your attempts!",
+    "Number needs to be between 1 to 10! Guess again: ",
+    "Please enter a valid number. Guess again: ",
+    "Choose game mode: '1' for single player, '2' for multi player, 'exit' to terminate:",
+    "You have a total of 5 attempts. Enter 'exit' to prematurely leave the game. Guess a number between 1 to 10:",
+    "Choose a number between 1 to 10! Guess again: ",
+    "Invalid input! Choose a number between 1 to 10 or type 'exit' to quit.",
+    "Multi player game started! Each player has 5 attempts. "
+    "Enter 'exit' to prematurely leave the game. Guess a number between 1 to 10:",
+    "Everyone has used all of their attempts without guessing the correct number! "
+    "Enter 'exit' to prematurely leave the game. \nStarting a new game with a new number. "
+    "All clients have 5 new attempts!\nGuess a number between 1 to 10: ",
+    "Everyone has used all of their attempts without guessing the correct number!\n"
+    "Enter 'exit' to prematurely leave the game.\nStarting a new game with a new number. "
+    "All clients have 5 new attempts!\nGuess a number between 1 to 10: ",
+    "Congratulations, you did it! Starting a new game with a new number.\n"
+    "Enter 'exit' to prematurely leave the game.\nAll clients have 5 new attempts! Guess a number between 1 to 10:",
+    "Congratulations, someone guessed the correct number! Starting a new game with a new number.\n"
+    "Enter 'exit' to prematurely leave the game.\nAll clients have 5 new attempts! Guess a number between 1 to 10: ",
+)
+
+# Known server messages are framed once up front, so sending one is a single dictionary lookup
+_MESSAGE_FRAMES = {}
+for _code, _text in enumerate(MESSAGE_CODES):
+    _MESSAGE_FRAMES[_text] = FRAME_HEADER.pack(2) + bytes((OP_MESSAGE_CODE, _code))
+
+
+# Function to encode a message with the compact binary codec, or None if it has no binary form
+def encode_binary_payload(message):
+    if len(message) != 1:
+        return None
+    key, value = next(iter(message.items()))
+    if key == 'message' and isinstance(value, str):
+        return bytes((OP_MESSAGE_TEXT,)) + value.encode('utf-8')
+    if key == 'guess':
+        try:
+            guess = int(value)
+            return bytes((OP_GUESS,)) + GUESS_FORMAT.pack(guess)
+        except (ValueError, TypeError, struct.error):
+            # Not a small integer, so it is sent as JSON and the server answers it as invalid input
+            return None
+    if key == 'mode' and isinstance(value, str):
+        return bytes((OP_MODE,)) + value.encode('utf-8')
+    if key == 'exit':
+        return bytes((OP_EXIT,))
+    return None
+
+
+# Function to decode one frame payload, whichever codec it was written with
+def decode_payload(payload):
+    if not payload:
+        raise ValueError("Empty message.")
+    opcode = payload[0]
+    if opcode == JSON_START:
+        message = json.loads(str(payload, 'utf-8'))
+        if not isinstance(message, dict):
+            raise ValueError("Message must be a JSON object.")
+        return message
+    if opcode == OP_MESSAGE_CODE:
+        try:
+            return {"message": MESSAGE_CODES[payload[1]]}
+        except IndexError:
+            raise ValueError("Unknown message code.")
+    if opcode == OP_MESSAGE_TEXT:
+        return {"message": str(payload[1:], 'utf-8')}
+    if opcode == OP_GUESS:
+        if len(payload) != 1 + GUESS_FORMAT.size:
+            raise ValueError("Guess frame has the wrong length.")
+        return {"guess": GUESS_FORMAT.unpack(payload[1:])[0]}
+    if opcode == OP_MODE:
+        return {"mode": str(payload[1:], 'utf-8')}
+    if opcode == OP_EXIT:
+        return {"exit": "exit"}
+    raise ValueError(f"Unknown opcode {opcode}.")
+
+
+# Function to tell which codec a frame payload was written with
+def payload_codec(payload):
+    return JSON_CODEC if payload and payload[0] == JSON_START else BINARY_CODEC
+
+
+# Function to frame one message with the given codec (messages without a binary form fall back to JSON)
+def encode_frame(message, codec=JSON_CODEC):
+    if codec == BINARY_CODEC:
+        if len(message) == 1 and message.get('message') in _MESSAGE_FRAMES:
+            return _MESSAGE_FRAMES[message['message']]
+        payload = encode_binary_payload(message)
+        if payload is not None:
+            return FRAME_HEADER.pack(len(payload)) + payload
+    payload = json.dumps(message).encode('utf-8')
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+# Function to frame several messages into one buffer, so they can be pipelined with a single write
+def encode_frames(messages, codec=JSON_CODEC):
+    return b''.join(encode_frame(message, codec) for message in messages)
+
+
+class FrameDecoder:
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        # Incremental decoder: feed it bytes as they arrive and take out complete messages
+        self.buffer = bytearray()
+        self.offset = 0
+        self.max_frame_size = max_frame_size
+        self.last_codec = None
+
+    def feed(self, data):
+        # Drop consumed bytes before growing the buffer, so it doesn't grow with the number of messages
+        if self.offset:
+            del self.buffer[:self.offset]
+            self.offset = 0
+        self.buffer += data
+
+    def next_message(self):
+        # Return the next complete message, or None if more bytes are needed
+        available = len(self.buffer) - self.offset
+        if available < FRAME_HEADER.size:
+            return None
+        (length,) = FRAME_HEADER.unpack_from(self.buffer, self.offset)
+        if length > self.max_frame_size:
+            raise ConnectionError(f"Frame of {length} bytes exceeds the limit of {self.max_frame_size} bytes.")
+        if available < FRAME_HEADER.size + length:
+            return None
+        start = self.offset + FRAME_HEADER.size
+        self.offset = start + length
+        # Decode straight out of the receive buffer through a memoryview instead of slicing a copy
+        with memoryview(self.buffer) as view:
+            payload = view[start:self.offset]
+            self.last_codec = payload_codec(payload)
+            return decode_payload(payload)
+
+    def messages(self):
+        # Yield every complete message that is already buffered
+        while True:
+            message = self.next_message()
+            if message is None:
+                return
+            yield message
+
+    def has_partial_frame(self):
+        return len(self.buffer) > self.offset
+
+
+class MessageStream:
+    def __init__(self, sock, recv_size=65536, codec=JSON_CODEC):
+        # Framed messages over a (TLS) socket, received through one reusable buffer.
+        # codec is used for sending; received frames are decoded whatever codec the peer used.
+        self.sock = sock
+        self.codec = codec
+        self.decoder = FrameDecoder()
+        self.recv_buffer = bytearray(recv_size)
+        self.recv_view = memoryview(self.recv_buffer)
+        self.send_lock = threading.Lock()
+
+    def send(self, message):
+        self.send_all(encode_frame(message, self.codec))
+
+    def send_many(self, messages):
+        self.send_all(encode_frames(messages, self.codec))
+
+    def send_all(self, data):
+        # Several threads may send to the same client (e.g. multiplayer announcements), so writes are serialized
+        with self.send_lock:
+            self.sock.sendall(data)
+
+    def recv(self):
+        # Return the next message, or None if the peer closed the connection.
+        # Messages that arrived together are returned one by one without calling recv again.
+        while True:
+            message = self.decoder.next_message()
+            if message is not None:
+                return message
+            received = self.sock.recv_into(self.recv_buffer)
+            if not received:
+                if self.decoder.has_partial_frame():
+                    raise ConnectionError("Connection closed in the middle of a message.")
+                return None
+            self.decoder.feed(self.recv_view[:received])
+
+    @property
+    def peer_codec(self):
+        # Codec of the last message received, so a client can follow the server's answer to its codec request
+        return self.decoder.last_codec
+
+    def fileno(self):
+        return self.sock.fileno()
+
+
+# Function to read one message from an asyncio StreamReader, or None if the peer closed the connection
+async def read_message(reader, max_frame_size=MAX_FRAME_SIZE):
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ConnectionError("Connection closed in the middle of a message.")
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > max_frame_size:
+        raise ConnectionError(f"Frame of {length} bytes exceeds the limit of {max_frame_size} bytes.")
+    try:
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Connection closed in the middle of a message.")
+    return decode_payload(payload)
+
+
+# Function to queue one message on an asyncio StreamWriter (call drain() to apply backpressure)
+def write_message(writer, message, codec=JSON_CODEC):
+    writer.write(encode_frame(message, codec))
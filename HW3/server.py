@@ -1,278 +1,953 @@
-import socket
-import ssl
-import random
-import json
-import threading
-import logging
-import zmq
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-
-def determine_response(guess, number):
-    if guess == number:
-        return "Congratulations, you did it!"
-    elif guess < number:
-        return "Hint: You guessed too small! Guess again: "
-    else:
-        return "Hint: You guessed too high! Guess again: "
-
-
-class GameServer:
-    def __init__(self, host='127.0.0.1', port=65432, zmq_pub_port=5557):
-        # Initialize server with SSL context and ZeroMQ publisher socket
-        self.host = host
-        self.port = port
-        self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-        self.context.load_cert_chain(certfile='cert.crt', keyfile='key.pem')
-        self.server_socket = None
-        self.clients = []
-        self.multi_player_clients = []  # List to track multiplayer clients
-        self.multi_player_attempts = {}  # Dictionary to track attempts for each client
-        self.multi_player_number = None
-        self.multi_player_lock = threading.Lock()
-        self.multi_player_active = False
-        self.zmq_context = zmq.Context()
-        self.pub_socket = self.zmq_context.socket(zmq.PUB)
-        self.pub_socket.bind(f"tcp://*:{zmq_pub_port}")
-
-    def start(self):
-        # Start the SSL server and listen for incoming connections
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            sock.bind((self.host, self.port))
-            sock.listen()
-            self.server_socket = self.context.wrap_socket(sock, server_side=True)
-            logging.info(f"SSL server listening on {self.host}:{self.port}")
-            while True:
-                try:
-                    connection, address = self.server_socket.accept()
-                    logging.info(f"Connected by {address}")
-                    client_thread = threading.Thread(target=self.handle_client, args=(connection,))
-                    client_thread.start()
-                except ssl.SSLError as e:
-                    logging.error(f"SSL error: {e}")
-                except Exception as e:
-                    logging.error(f"Error accepting connection: {e}")
-
-    def handle_client(self, connection):
-        with connection:
-            try:
-                while True:
-                    mode_message = json.dumps({
-                        "message": "Choose game mode: '1' for single player, '2' for multi player, 'exit' to terminate:"
-                    })
-                    connection.sendall(mode_message.encode('utf-8'))
-                    mode_data = connection.recv(1024).decode('utf-8').strip()
-                    if not mode_data:
-                        raise ConnectionError("Client disconnected unexpectedly.")
-
-                    mode_json = json.loads(mode_data)
-                    mode = mode_json.get('mode')
-
-                    # Go to single play, multi play, or exit based on client input
-                    if mode == '1':
-                        self.single_player_game(connection)
-                    elif mode == '2':
-                        self.multi_player_game(connection)
-                    elif mode and mode.lower() == 'exit':
-                        logging.info("Client chose to exit. Closing connection between the client.")
-                        break
-            except ConnectionError as e:
-                logging.info(f"Unexpected Error: {e}")
-            except Exception as e:
-                logging.error(f"Error handling client: {e}")
-
-    def single_player_game(self, connection):
-        # Start a single player game session with the client
-        logging.info("Single player game session started.")
-        number = random.randint(1, 10)
-        attempts = 0
-        max_attempts = 5
-        # Tell client the rules of the game.
-        msg = json.dumps({"message": f"You have a total of {max_attempts} attempts. "
-                                     "Enter 'exit' to prematurely leave the game. "
-                                     "Guess a number between 1 to 10:"})
-        connection.sendall(msg.encode('utf-8'))
-
-        # If all attempts are exhausted, or if client enters exit, or if client guesses correct number,
-        # tell the message accordingly to the client and exit the game to reprompt the client to choose a gamemode.
-        while attempts < max_attempts:
-            try:
-                data = connection.recv(1024).decode('utf-8').strip()
-                if not data:
-                    raise ConnectionError("Client disconnected unexpectedly.")
-                data_json = json.loads(data)
-                if 'guess' in data_json:
-                    guess = int(data_json['guess'])
-                    # Incorrect number guess
-                    if guess > 10 or guess <= 0:
-                        response = "Choose a number between 1 to 10! Guess again: "
-                    else:
-                        response = determine_response(guess, number)
-                        attempts += 1
-                        # If used all attempts and response wasn't the correct guess response send "Sorry..."
-                        if attempts >= max_attempts and not response.startswith("Congratulations"):
-                            response = "Sorry, you've used all of your attempts!"
-                    msg = json.dumps({"message": response})
-                    connection.sendall(msg.encode('utf-8'))
-                    # If response had "Congratulations" or "Sorry" indicating game is over, break from guessing
-                    if response.startswith("Congratulations") or "Sorry" in response:
-                        break
-                # If client entered "exit" leave game.
-                elif 'exit' in data_json:
-                    logging.info("Client chose to exit the single player game.")
-                    break
-            except (json.JSONDecodeError, ValueError, KeyError) as e:
-                logging.error(f"JSON decode error or invalid guess: {e}")
-                msg = json.dumps({"message": "Invalid input! Choose a number between 1 to 10 or type 'exit' to quit."})
-                connection.sendall(msg.encode('utf-8'))
-            except ConnectionError as e:
-                logging.info(f"Unexpected error: {e}")
-                break
-            except Exception as e:
-                logging.error(f"Unexpected error: {e}")
-                break
-        logging.info("Single player game session ended.")
-
-    def multi_player_game(self, connection):
-        logging.info("Multi player game session started.")
-        max_attempts = 5
-        with self.multi_player_lock:
-            if not self.multi_player_active:
-                self.multi_player_number = random.randint(1, 10)
-                self.multi_player_active = True
-            self.multi_player_clients.append(connection)  # Add to multiplayer clients
-            self.multi_player_attempts[connection] = max_attempts  # Set max attempts for each client
-
-        msg = json.dumps({"message": f"Multi player game started! Each player has {max_attempts} attempts. "
-                                     "Enter 'exit' to prematurely leave the game. Guess a number between 1 to 10:"})
-        connection.sendall(msg.encode('utf-8'))
-
-        while True:
-            try:
-                data = connection.recv(1024).decode('utf-8').strip()
-                if not data:
-                    raise ConnectionError("Client disconnected unexpectedly.")
-                data_json = json.loads(data)
-                if data_json.get('guess'):
-                    try:
-                        guess = int(data_json.get('guess'))
-                        with self.multi_player_lock:
-                            # Check if all clients have exhausted their attempts
-                            if all(attempts <= 0 for attempts in self.multi_player_attempts.values()):
-                                for client in self.multi_player_clients:
-                                    msg = json.dumps({
-                                        "message": "Everyone has used all of their attempts without guessing the "
-                                                   "correct number! Enter 'exit' to prematurely leave the game. \n"
-                                                   "Starting a new game with a new number. All clients have"
-                                                   f" {max_attempts} new attempts!\nGuess a number between 1 to 10: "})
-                                    try:
-                                        client.sendall(msg.encode('utf-8'))
-                                    except Exception as e:
-                                        logging.error(f"Error sending message to client: {e}")
-                                self.multi_player_number = random.randint(1, 10)  # Reset number
-                                self.multi_player_attempts = {c: max_attempts for c in
-                                                              self.multi_player_clients}  # Reset attempts
-                                continue
-
-                            # If all clients had not used all their attempts and the particular client has used all of its attempts
-                            if self.multi_player_attempts[connection] <= 0:
-                                response = "Sorry, you've used all of your attempts!"
-                                individual_msg = json.dumps({"message": response})
-                                connection.sendall(individual_msg.encode('utf-8'))
-                                continue  # Skip the rest of the loop to avoid processing the guess
-
-                            if guess > 10 or guess <= 0:
-                                response = "Choose a number between 1 to 10! Guess again: "
-                            else:
-                                self.multi_player_attempts[connection] -= 1
-                                response = determine_response(guess, self.multi_player_number)
-                                if response.startswith("Congratulations"):
-                                    self.multi_player_number = random.randint(1, 10)  # Reset number
-                                    for client in self.multi_player_clients:
-                                        # Send "you did it" message to the client who guessed the correct message
-                                        if client == connection:
-                                            msg = json.dumps({"message": "Congratulations, you did it! Starting a new game "
-                                                                         "with a new number.\nEnter 'exit' to prematurely leave the game.\n"
-                                                                         "All clients have "
-                                                                         f"{max_attempts} new attempts! Guess a number "
-                                                                         "between 1 to 10:"})
-                                        # If not the client who guessed the correct message, send
-                                        # "someone guessed the correct ... " message
-                                        else:
-                                            msg = json.dumps({"message": "Congratulations, someone guessed the correct "
-                                                                         "number! Starting a new game with a new number."
-                                                                         "\nEnter 'exit' to prematurely leave the game.\n"
-                                                                         f"All clients have {max_attempts} new attempts!"
-                                                                         " Guess a number between 1 to 10: "})
-                                        try:
-                                            client.sendall(msg.encode('utf-8'))
-                                        except Exception as e:
-                                            logging.error(f"Error sending message to client: {e}")
-                                    self.multi_player_attempts = {c: max_attempts for c in
-                                                                  self.multi_player_clients}  # Reset attempts
-                                    continue
-                                # Check if all clients have exhausted their attempts
-                                if all(attempts <= 0 for attempts in self.multi_player_attempts.values()):
-                                    for client in self.multi_player_clients:
-                                        msg = json.dumps({
-                                            "message": "Everyone has used all of their attempts without guessing the "
-                                                       "correct number!\nEnter 'exit' to prematurely leave the game.\n"
-                                                       "Starting a new game with a new number. All clients have"
-                                                       f" {max_attempts} new attempts!\nGuess a number between 1 to 10: "})
-                                        try:
-                                            client.sendall(msg.encode('utf-8'))
-                                        except Exception as e:
-                                            logging.error(f"Error sending message to client: {e}")
-                                    self.multi_player_number = random.randint(1, 10)  # Reset number
-                                    self.multi_player_attempts = {c: max_attempts for c in
-                                                                  self.multi_player_clients}  # Reset attempts
-                                    continue
-                            # If all clients haven't exhausted all their attempts and the guess wasn't correct,
-                            # send message "Sorry, you've ..."
-                            if self.multi_player_attempts[connection] <= 0:
-                                response = "Sorry, you've used all of your attempts!"
-                                individual_msg = json.dumps({"message": response})
-                                connection.sendall(individual_msg.encode('utf-8'))
-                            else:
-                                individual_msg = json.dumps({"message": response})
-                                connection.sendall(individual_msg.encode('utf-8'))
-                    except (ValueError, KeyError):
-                        response = "Choose a number between 1 to 10! Guess again: "
-                        individual_msg = json.dumps({"message": response})
-                        connection.sendall(individual_msg.encode('utf-8'))
-                # If client enters "exit", multiplayer exits multiplayer session and
-                # server takes the client out of the clients that are in multiplayer session
-                elif data_json.get('exit'):
-                    logging.info("Client chose to exit multiplayer session.")
-                    with self.multi_player_lock:
-                        self.multi_player_clients.remove(connection)
-                        del self.multi_player_attempts[connection]
-                        if not self.multi_player_clients:
-                            self.multi_player_active = False
-                    break
-            # If error from client, take that client out of the clients in multiplayer session
-            except ConnectionError as e:
-                logging.info(f"Unexpected Error: {e}")
-                with self.multi_player_lock:
-                    if connection in self.multi_player_clients:
-                        self.multi_player_clients.remove(connection)
-                        del self.multi_player_attempts[connection]
-                        if not self.multi_player_clients:
-                            self.multi_player_active = False
-                break
-            except Exception as e:
-                logging.error(f"Unexpected error: {e}")
-                break
-
-        logging.info("Multi player game session ended.")
-
-
-if __name__ == "__main__":
-    try:
-        server = GameServer()
-        server.start()
-    except Exception as e:
-        logging.error(f"Server error: {e}")
+import argparse
+import itertools
+import json
+import selectors
+import socket
+import ssl
+import sys
+import random
+import threading
+import logging
+import zlib
+import zmq
+from concurrent.futures import ThreadPoolExecutor, wait
+from fanout import DISCONNECT, DROP, SLOW_CONSUMER_POLICIES, FanoutStats, OutboundQueue, room_topic
+from framing import CODECS, JSON_CODEC, FrameDecoder, MessageStream, encode_frame
+from prefork import Supervisor, report_stats
+from tls_sessions import HandshakeCounter, enable_session_tickets
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+MAX_ATTEMPTS = 5
+MODE_PROMPT = "Choose game mode: '1' for single player, '2' for multi player, 'exit' to terminate:"
+
+
+# Function to build the reply that tells a client it is now playing in a multiplayer room
+def multi_player_started(room_name):
+    return {"message": f"Multi player game started! Each player has {MAX_ATTEMPTS} attempts. "
+                       "Enter 'exit' to prematurely leave the game. Guess a number between 1 to 10:",
+            "room": room_name}
+
+
+# Function to tell which worker process owns a room (and runs its game) when the server runs several workers
+def room_owner(room_name, workers):
+    return zlib.crc32(room_name.encode('utf-8')) % workers
+
+
+def determine_response(guess, number):
+    if guess == number:
+        return "Congratulations, you did it!"
+    elif guess < number:
+        return "Hint: You guessed too small! Guess again: "
+    else:
+        return "Hint: You guessed too high! Guess again: "
+
+
+class ClientSession:
+    # States of a client: choosing a mode, or playing a single / multi player game
+    MENU = 'menu'
+    SINGLE = 'single'
+    MULTI = 'multi'
+
+    def __init__(self, server, transport):
+        # Per-client game state as an explicit state machine. The transport (ThreadConnection or EventConnection)
+        # provides send(message), enqueue(frame) for broadcasts and a codec attribute, so the same session works
+        # on a worker thread or on the non-blocking event loop.
+        self.server = server
+        self.transport = transport
+        self.state = self.MENU
+        self.number = None
+        self.attempts = 0
+        self.room = None
+        # Identifies the client in messages between worker processes
+        self.player_id = next(server.player_ids)
+        # Set once the client has confirmed it receives its room's announcements on the PUB socket, so they
+        # needn't be sent over its connection too (see multi_player_message)
+        self.subscribed = False
+
+    def send(self, message):
+        self.transport.send(message)
+
+    @property
+    def name(self):
+        # How the client is shown in room events
+        host, port = self.transport.address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        # Greet a new client with the mode prompt
+        self.send({"message": MODE_PROMPT})
+
+    def handle(self, data_json):
+        # Handle one message from the client. Returns False when the connection should be closed.
+        if self.state == self.SINGLE:
+            self.single_player_message(data_json)
+        elif self.state == self.MULTI:
+            self.multi_player_message(data_json)
+        else:
+            return self.menu_message(data_json)
+        return True
+
+    def handle_malformed(self, error):
+        # A message that could not be decoded is answered like any other invalid input
+        logging.error(f"JSON decode error or invalid guess: {error}")
+        if self.state == self.SINGLE:
+            self.send({"message": "Invalid input! Choose a number between 1 to 10 or type 'exit' to quit."})
+        elif self.state == self.MULTI:
+            self.send({"message": "Choose a number between 1 to 10! Guess again: "})
+        else:
+            self.send({"message": MODE_PROMPT})
+
+    def close(self):
+        # Connection is gone: take the client out of the multiplayer game it was in
+        if self.state == self.MULTI:
+            self.server.leave_multi_player(self, self.room)
+            self.state = self.MENU
+            self.room = None
+
+    def back_to_menu(self):
+        # Game is over, so reprompt the client to choose a gamemode
+        self.state = self.MENU
+        self.send({"message": MODE_PROMPT})
+
+    def menu_message(self, mode_json):
+        mode = mode_json.get('mode')
+        # The client may ask for the compact binary codec in its mode message
+        if mode_json.get('codec') in CODECS:
+            self.transport.codec = mode_json['codec']
+
+        # Go to single play, multi play, or exit based on client input
+        if mode == '1':
+            self.start_single_player()
+        elif mode == '2':
+            self.subscribed = False
+            self.start_multi_player(mode_json.get('room'))
+        elif isinstance(mode, str) and mode.lower() == 'exit':
+            logging.info("Client chose to exit. Closing connection between the client.")
+            return False
+        else:
+            self.send({"message": MODE_PROMPT})
+        return True
+
+    def start_single_player(self):
+        # Start a single player game session with the client
+        logging.info("Single player game session started.")
+        self.state = self.SINGLE
+        self.number = random.randint(1, 10)
+        self.attempts = 0
+        # Tell client the rules of the game.
+        self.send({"message": f"You have a total of {MAX_ATTEMPTS} attempts. "
+                              "Enter 'exit' to prematurely leave the game. "
+                              "Guess a number between 1 to 10:"})
+
+    def single_player_message(self, data_json):
+        # If all attempts are exhausted, or if client enters exit, or if client guesses correct number,
+        # tell the message accordingly to the client and exit the game to reprompt the client to choose a gamemode.
+        try:
+            if 'guess' in data_json:
+                guess = int(data_json['guess'])
+                # Incorrect number guess
+                if guess > 10 or guess <= 0:
+                    response = "Choose a number between 1 to 10! Guess again: "
+                else:
+                    response = determine_response(guess, self.number)
+                    self.attempts += 1
+                    # If used all attempts and response wasn't the correct guess response send "Sorry..."
+                    if self.attempts >= MAX_ATTEMPTS and not response.startswith("Congratulations"):
+                        response = "Sorry, you've used all of your attempts!"
+                self.send({"message": response})
+                # If response had "Congratulations" or "Sorry" indicating game is over, leave the game
+                if response.startswith("Congratulations") or "Sorry" in response:
+                    logging.info("Single player game session ended.")
+                    self.back_to_menu()
+            # If client entered "exit" leave game.
+            elif 'exit' in data_json:
+                logging.info("Client chose to exit the single player game.")
+                logging.info("Single player game session ended.")
+                self.back_to_menu()
+        except (ValueError, TypeError, OverflowError) as e:
+            logging.error(f"JSON decode error or invalid guess: {e}")
+            self.send({"message": "Invalid input! Choose a number between 1 to 10 or type 'exit' to quit."})
+
+    def start_multi_player(self, room_name=None):
+        # Join the requested room, or let the server pick one with space
+        room = self.server.join_multi_player(self, str(room_name) if room_name else None)
+        if room is None:
+            self.room_full(room_name)
+            return
+        logging.info(f"Multi player game session started in {room.name}.")
+        self.state = self.MULTI
+        self.room = room
+        # A room owned by another worker process answers the join itself, with this message or "full"
+        if isinstance(room, Room):
+            self.send(multi_player_started(room.name))
+
+    def room_full(self, room_name):
+        self.send(self.leave_full_room(room_name))
+
+    def leave_full_room(self, room_name):
+        # Back to the menu if we were joining room_name; returns the reply telling the client
+        if self.room is not None and self.room.name == room_name:
+            self.state = self.MENU
+            self.room = None
+        return {"message": f"Room {room_name} is full! " + MODE_PROMPT}
+
+    def multi_player_message(self, data_json):
+        if 'guess' in data_json:
+            try:
+                guess = int(data_json['guess'])
+            except (ValueError, TypeError, OverflowError):
+                self.send({"message": "Choose a number between 1 to 10! Guess again: "})
+                return
+            self.server.multi_player_guess(self, self.room, guess)
+        # If client enters "exit", multiplayer exits multiplayer session and
+        # server takes the client out of the clients that are in multiplayer session
+        # A client subscribed to the room's topic asks for a "sync" event there. Only once it has received one
+        # does it confirm with 'subscribed', so announcements keep coming over the connection until its
+        # subscription is live (or forever, if it can't reach the PUB socket).
+        elif 'subscribe' in data_json:
+            if data_json['subscribe'] == self.room.name:
+                self.server.publish([{"event": "sync", "room": self.room.name, "player": self.name}])
+        elif 'subscribed' in data_json:
+            if data_json['subscribed'] == self.room.name:
+                self.server.subscribe(self, self.room)
+        elif data_json.get('exit'):
+            logging.info("Client chose to exit multiplayer session.")
+            self.server.leave_multi_player(self, self.room)
+            self.room = None
+            logging.info("Multi player game session ended.")
+            self.back_to_menu()
+
+
+class Room:
+    def __init__(self, name, max_players):
+        # One multiplayer game. Each room has its own lock, so guesses in different rooms never wait on each other.
+        self.name = name
+        self.max_players = max_players
+        self.lock = threading.Lock()
+        self.players = []  # List to track the room's clients
+        self.attempts = {}  # Dictionary to track attempts for each client
+        self.players_with_attempts = 0  # Clients with attempts left, so "everyone used theirs" is O(1)
+        self.number = random.randint(1, 10)
+        self.round = 1
+
+    def is_full(self):
+        return len(self.players) >= self.max_players
+
+    def event(self, kind, **fields):
+        # A room event as published on the PUB socket
+        return {"event": kind, "room": self.name, "round": self.round, "players": len(self.players), **fields}
+
+    def join(self, session):
+        # Called with the server's rooms_lock held
+        with self.lock:
+            if self.is_full():
+                return None
+            self.players.append(session)
+            self.attempts[session] = MAX_ATTEMPTS
+            self.players_with_attempts += 1
+            return self.event("join", player=session.name)
+
+    def leave(self, session):
+        # Called with the server's rooms_lock held. Returns the leave event, or None if the client wasn't here.
+        with self.lock:
+            if session not in self.attempts:
+                return None
+            self.players.remove(session)
+            if self.attempts.pop(session) > 0:
+                self.players_with_attempts -= 1
+            return self.event("leave", player=session.name)
+
+    def reset(self):
+        self.number = random.randint(1, 10)  # Reset number
+        self.attempts = {c: MAX_ATTEMPTS for c in self.players}  # Reset attempts
+        self.players_with_attempts = len(self.players)
+        self.round += 1
+
+    def new_round(self, session, reply, announcement, event):
+        # The round is over: the guesser gets its reply, everyone else the announcement, and a new round starts
+        others = [client for client in self.players if client is not session]
+        self.reset()
+        return [(session, reply)], (announcement, others), [event, self.event("round_start")]
+
+    def guess(self, session, guess):
+        # Play one guess. Only the game state is updated under the lock; what to send is returned and sent after
+        # the lock is released, so a slow client can't stall the room. Returns (replies, announcement, events):
+        # replies are (client, message) pairs for the guesser, announcement is None or (message, other players),
+        # and events are room events for the PUB socket.
+        with self.lock:
+            if session not in self.attempts:
+                return [], None, []
+            # Check if all clients have exhausted their attempts
+            if self.players_with_attempts == 0:
+                msg = {"message": "Everyone has used all of their attempts without guessing the "
+                                  "correct number! Enter 'exit' to prematurely leave the game. \n"
+                                  "Starting a new game with a new number. All clients have"
+                                  f" {MAX_ATTEMPTS} new attempts!\nGuess a number between 1 to 10: "}
+                return self.new_round(session, msg, msg,
+                                      self.event("reset", player=session.name, message=msg["message"]))
+
+            # If all clients had not used all their attempts and the particular client has used all of its attempts
+            if self.attempts[session] <= 0:
+                return [(session, {"message": "Sorry, you've used all of your attempts!"})], None, []
+
+            if guess > 10 or guess <= 0:
+                response = "Choose a number between 1 to 10! Guess again: "
+            else:
+                self.attempts[session] -= 1
+                if self.attempts[session] == 0:
+                    self.players_with_attempts -= 1
+                response = determine_response(guess, self.number)
+                if response.startswith("Congratulations"):
+                    # Send "you did it" message to the client who guessed the correct message, and
+                    # "someone guessed the correct ... " message to everyone else
+                    winner_msg = {"message": "Congratulations, you did it! Starting a new game "
+                                             "with a new number.\nEnter 'exit' to prematurely leave the game.\n"
+                                             "All clients have "
+                                             f"{MAX_ATTEMPTS} new attempts! Guess a number "
+                                             "between 1 to 10:"}
+                    others_msg = {"message": "Congratulations, someone guessed the correct "
+                                             "number! Starting a new game with a new number."
+                                             "\nEnter 'exit' to prematurely leave the game.\n"
+                                             f"All clients have {MAX_ATTEMPTS} new attempts!"
+                                             " Guess a number between 1 to 10: "}
+                    return self.new_round(session, winner_msg, others_msg,
+                                          self.event("winner", player=session.name, number=self.number,
+                                                     message=others_msg["message"]))
+                # Check if all clients have exhausted their attempts
+                if self.players_with_attempts == 0:
+                    msg = {"message": "Everyone has used all of their attempts without guessing the "
+                                      "correct number!\nEnter 'exit' to prematurely leave the game.\n"
+                                      "Starting a new game with a new number. All clients have"
+                                      f" {MAX_ATTEMPTS} new attempts!\nGuess a number between 1 to 10: "}
+                    return self.new_round(session, msg, msg,
+                                      self.event("reset", player=session.name, message=msg["message"]))
+            # If all clients haven't exhausted all their attempts and the guess wasn't correct,
+            # send message "Sorry, you've ..."
+            if self.attempts[session] <= 0:
+                response = "Sorry, you've used all of your attempts!"
+            return [(session, {"message": response})], None, []
+
+
+class RemotePlayer:
+    def __init__(self, worker, player_id, name, subscribed):
+        # A client connected to another worker process, playing in a room this process owns
+        self.worker = worker
+        self.player_id = player_id
+        self.name = name
+        self.subscribed = subscribed
+
+
+class RemoteRoom:
+    def __init__(self, name, owner):
+        # A room owned by another worker process; the local client's moves are routed there
+        self.name = name
+        self.owner = owner
+
+
+class ThreadConnection:
+    def __init__(self, server, stream, address):
+        # One client of the threads backend. Everything sent to it goes through its bounded outbound queue and
+        # is written by its own writer thread, so no game thread ever blocks on this client's socket.
+        self.server = server
+        self.stream = stream
+        self.address = address
+        self.codec = JSON_CODEC
+        self.outbound = OutboundQueue(stream, server.max_buffered_bytes)
+
+    def send(self, message):
+        # Replies to the client's own requests wait for room in the queue
+        self.outbound.put(encode_frame(message, self.codec))
+
+    def enqueue(self, frame):
+        # Queue an already encoded broadcast frame; False if the queue is full
+        return self.outbound.put(frame, block=False)
+
+    def depth(self):
+        return self.outbound.depth()
+
+    def disconnect(self):
+        self.outbound.abort()
+
+
+class EventConnection:
+    def __init__(self, server, sock, address):
+        # One client of the selectors backend: a non-blocking TLS socket with its own receive and send buffers
+        self.server = server
+        self.sock = sock
+        self.address = address
+        self.codec = JSON_CODEC
+        self.handshaking = True
+        self.decoder = FrameDecoder()
+        self.out_buffer = bytearray()
+        self.session = None
+        self.closed = False
+        self.events = 0
+
+    def send(self, message):
+        # Queue a message and try to write it right away; whatever doesn't fit waits for the socket to be writable
+        if self.closed:
+            return
+        self.out_buffer += encode_frame(message, self.codec)
+        self.server.flush(self)
+
+    def enqueue(self, frame):
+        # Queue an already encoded broadcast frame; False if the send buffer is full
+        if self.closed:
+            return True
+        if len(self.out_buffer) + len(frame) > self.server.max_buffered_bytes:
+            return False
+        self.out_buffer += frame
+        self.server.flush(self)
+        return True
+
+    def depth(self):
+        return len(self.out_buffer)
+
+    def disconnect(self):
+        # Closed by the event loop after the current batch, like a client whose write failed
+        self.server.failed_connections.append(self)
+
+
+class GameServer:
+    def __init__(self, host='127.0.0.1', port=65432, zmq_pub_port=5557, backend='threads', max_connections=1024,
+                 max_buffered_bytes=256 * 1024, room_size=16, slow_consumer=DROP, worker_id=0, workers=1,
+                 route_port=5560):
+        # Initialize server with SSL context and ZeroMQ publisher socket
+        self.host = host
+        self.port = port
+        self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.context.load_cert_chain(certfile='cert.crt', keyfile='key.pem')
+        # Session tickets let reconnecting clients resume instead of paying for a full handshake
+        enable_session_tickets(self.context)
+        self.handshake_stats = HandshakeCounter(self.context)
+        self.server_socket = None
+        # backend is 'threads' (bounded worker pool) or 'selectors' (one non-blocking event loop)
+        self.backend = backend
+        self.max_connections = max_connections
+        # A client with more than this many unsent bytes is not read from until it catches up, and
+        # broadcasts that don't fit are handled by the slow consumer policy ('drop' or 'disconnect')
+        self.max_buffered_bytes = max_buffered_bytes
+        self.slow_consumer = slow_consumer
+        self.fanout_stats = FanoutStats()
+        self.active_connections = 0
+        self.selector = None
+        self.failed_connections = []
+        # Multiplayer rooms by name. rooms_lock only guards finding/creating/removing rooms;
+        # each room has its own lock for its game.
+        self.room_size = room_size
+        self.rooms = {}
+        self.open_rooms = {}  # Rooms that are not full, in creation order, for matchmaking
+        self.rooms_lock = threading.Lock()
+        self.room_ids = itertools.count(1)
+        self.player_ids = itertools.count(1)
+        # With several worker processes (see serve_workers) each room is owned by one worker. Moves of clients
+        # connected elsewhere are routed to the owner over ZeroMQ, and the owner routes their replies back.
+        self.worker_id = worker_id
+        self.workers = workers
+        self.route_port = route_port
+        self.local_players = {}  # Our clients playing in rooms of other workers, by player id
+        self.remote_players = {}  # Clients of other workers playing in our rooms, by (worker, player id)
+        self.route_sockets = {}
+        self.route_lock = threading.Lock()
+        self.zmq_context = zmq.Context()
+        self.pub_socket = self.zmq_context.socket(zmq.PUB)
+        if workers > 1:
+            # Every worker publishes into the supervisor, which forwards to the port clients subscribe to
+            self.pub_socket.connect(f"tcp://127.0.0.1:{zmq_pub_port + 1}")
+            self.route_socket = self.zmq_context.socket(zmq.PULL)
+            self.route_socket.bind(f"tcp://127.0.0.1:{route_port + worker_id}")
+        else:
+            self.pub_socket.bind(f"tcp://*:{zmq_pub_port}")
+            self.route_socket = None
+        self.pub_lock = threading.Lock()
+
+    def stats_snapshot(self):
+        # Counters reported to the supervisor when running as one of several workers
+        handshakes = self.handshake_stats.snapshot()
+        fanout = self.fanout_stats.snapshot()
+        return {'handshakes_full': handshakes['full'], 'handshakes_resumed': handshakes['resumed'],
+                'broadcasts': fanout['broadcasts'], 'dropped': fanout['dropped'],
+                'disconnected': fanout['disconnected']}
+
+    def start(self):
+        # Start the SSL server and listen for incoming connections
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.workers > 1:
+                # Every worker listens on the same port and the kernel spreads new connections between them
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind((self.host, self.port))
+            sock.listen()
+            self.server_socket = sock
+            logging.info(f"SSL server listening on {self.host}:{self.port} ({self.backend} backend, "
+                         f"at most {self.max_connections} connections, worker {self.worker_id + 1}/{self.workers})")
+            if self.route_socket is not None and self.backend != 'selectors':
+                threading.Thread(target=self.serve_routes, name='routes', daemon=True).start()
+            if self.backend == 'selectors':
+                self.serve_selectors()
+            else:
+                self.serve_threads()
+
+    # ---- Multiplayer rooms ----
+
+    def join_multi_player(self, session, room_name=None):
+        # Put the client in the named room (created if needed), or matchmake it into the first room with space.
+        # Returns the room, or None if the named room is full. A room owned by another worker is returned as a
+        # RemoteRoom right away and the owner answers the join.
+        if room_name and self.workers > 1:
+            owner = room_owner(room_name, self.workers)
+            if owner != self.worker_id:
+                self.local_players[session.player_id] = session
+                self.route(owner, {"op": "join", "worker": self.worker_id, "player": session.player_id,
+                                   "name": session.name, "subscribed": session.subscribed, "room": room_name})
+                return RemoteRoom(room_name, owner)
+        return self.join_room(session, room_name)
+
+    def join_room(self, player, room_name=None):
+        # Join a room this process owns (a local client or a RemotePlayer)
+        events = []
+        with self.rooms_lock:
+            if room_name:
+                room = self.rooms.get(room_name)
+            else:
+                room = next(iter(self.open_rooms.values()), None)
+                room_name = room.name if room else self.new_room_name()
+            if room is None:
+                room = self.rooms[room_name] = self.open_rooms[room_name] = Room(room_name, self.room_size)
+                events.append(room.event("round_start"))
+            joined = room.join(player)
+            if joined is None:
+                return None
+            events.append(joined)
+            if room.is_full():
+                self.open_rooms.pop(room.name, None)
+        self.publish(events)
+        return room
+
+    def new_room_name(self):
+        # Auto-assigned names are picked so that this worker owns the room, so matchmaking stays local
+        while True:
+            room_name = f"room-{next(self.room_ids)}"
+            if room_owner(room_name, self.workers) == self.worker_id:
+                return room_name
+
+    def leave_multi_player(self, session, room):
+        if isinstance(room, RemoteRoom):
+            self.local_players.pop(session.player_id, None)
+            self.route(room.owner, {"op": "leave", "worker": self.worker_id, "player": session.player_id,
+                                    "room": room.name})
+            return
+        with self.rooms_lock:
+            left = room.leave(session)
+            if not room.players:
+                # Nobody left in the room, so the room (and its game) is gone
+                self.rooms.pop(room.name, None)
+                self.open_rooms.pop(room.name, None)
+            elif room.name in self.rooms:
+                self.open_rooms[room.name] = room
+        if left is not None:
+            self.publish([left])
+
+    def subscribe(self, session, room):
+        # The client gets the room's announcements from the PUB socket from now on
+        if isinstance(room, RemoteRoom):
+            self.route(room.owner, {"op": "subscribed", "worker": self.worker_id, "player": session.player_id})
+            return
+        session.subscribed = True
+
+    def publish(self, events):
+        # Room events go out once on the PUB socket, topic per room, however many players and spectators
+        # are subscribed. The socket is shared by every thread, so sends are serialized.
+        with self.pub_lock:
+            for event in events:
+                self.pub_socket.send_multipart([room_topic(event["room"]), json.dumps(event).encode('utf-8')])
+
+    def broadcast(self, messages, sender=None):
+        # Send each client its message. A message is encoded once per codec and the same frame is queued for
+        # every recipient. The sender's own reply waits for room in its queue; everyone else gets the slow
+        # consumer policy when their queue is full, so one stalled client never holds up the others.
+        frames = {}
+        deepest = 0
+        for client, msg in messages:
+            transport = client.transport
+            try:
+                if client is sender:
+                    client.send(msg)
+                    continue
+                key = (id(msg), transport.codec)
+                frame = frames.get(key)
+                if frame is None:
+                    frame = frames[key] = encode_frame(msg, transport.codec)
+                if not transport.enqueue(frame):
+                    self.fanout_stats.slow_consumer(self.slow_consumer)
+                    if self.slow_consumer == DISCONNECT:
+                        logging.info(f"Disconnecting slow client {transport.address}")
+                        transport.disconnect()
+                deepest = max(deepest, transport.depth())
+            except Exception as e:
+                logging.error(f"Error sending message to client: {e}")
+        if frames:
+            self.fanout_stats.record(sum(1 for client, msg in messages if client is not sender), deepest)
+
+    def multi_player_guess(self, session, room, guess):
+        # The room's lock is released before anything is sent. Announcements are published once as a room event,
+        # and only sent over the connection to players that aren't subscribed to the room's topic.
+        if isinstance(room, RemoteRoom):
+            self.route(room.owner, {"op": "guess", "worker": self.worker_id, "player": session.player_id,
+                                    "room": room.name, "guess": guess})
+            return
+        replies, announcement, events = room.guess(session, guess)
+        if announcement is not None:
+            msg, others = announcement
+            replies += [(client, msg) for client in others if not client.subscribed]
+        self.deliver(replies, sender=session)
+        self.publish(events)
+
+    def deliver(self, messages, sender=None):
+        # Send room messages to their players: our own clients directly, and the clients of each other worker
+        # with one routed message per worker, in which every distinct message body appears once
+        local = []
+        remote = {}
+        for client, msg in messages:
+            if isinstance(client, RemotePlayer):
+                remote.setdefault(client.worker, []).append((client, msg))
+            else:
+                local.append((client, msg))
+        if local:
+            self.broadcast(local, sender)
+        for worker, pairs in remote.items():
+            bodies = []
+            indexes = {}
+            to = []
+            for client, msg in pairs:
+                if id(msg) not in indexes:
+                    indexes[id(msg)] = len(bodies)
+                    bodies.append(msg)
+                to.append([client.player_id, indexes[id(msg)]])
+            self.route(worker, {"op": "deliver", "bodies": bodies, "to": to})
+
+    # ---- Routing between worker processes ----
+
+    def route(self, worker, message):
+        # Send a message to another worker's routing socket. PUSH sockets aren't thread-safe, so sends are serialized.
+        with self.route_lock:
+            push = self.route_sockets.get(worker)
+            if push is None:
+                push = self.route_sockets[worker] = self.zmq_context.socket(zmq.PUSH)
+                push.connect(f"tcp://127.0.0.1:{self.route_port + worker}")
+            push.send_json(message)
+
+    def serve_routes(self):
+        # 'threads' backend: a thread handles the messages other workers route to us
+        while True:
+            try:
+                self.handle_route(self.route_socket.recv_json())
+            except Exception as e:
+                logging.error(f"Error handling routed message: {e}")
+
+    def process_routes(self):
+        # 'selectors' backend: handle every routed message that is waiting, without blocking
+        while self.route_socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            try:
+                self.handle_route(self.route_socket.recv_json(flags=zmq.NOBLOCK))
+            except zmq.Again:
+                return
+            except Exception as e:
+                logging.error(f"Error handling routed message: {e}")
+
+    def handle_route(self, message):
+        op = message["op"]
+        if op == "deliver":
+            # Replies and announcements for our clients from the owner of their room. Nothing here waits for room
+            # in a client's queue, since this one thread handles the routed messages of every client.
+            pairs = []
+            for player_id, index in message["to"]:
+                session = self.local_players.get(player_id)
+                if session is not None:
+                    pairs.append((session, message["bodies"][index]))
+            self.broadcast(pairs)
+        elif op == "full":
+            # Queued like the deliveries above, with the slow consumer policy when the client's queue is full
+            session = self.local_players.pop(message["player"], None)
+            if session is not None:
+                self.broadcast([(session, session.leave_full_room(message["room"]))])
+        elif op == "join":
+            key = (message["worker"], message["player"])
+            player = self.remote_players[key] = RemotePlayer(message["worker"], message["player"], message["name"],
+                                                             message["subscribed"])
+            room = self.join_room(player, message["room"])
+            if room is None:
+                del self.remote_players[key]
+                self.route(player.worker, {"op": "full", "player": player.player_id, "room": message["room"]})
+            else:
+                self.deliver([(player, multi_player_started(room.name))])
+        elif op == "guess":
+            player = self.remote_players.get((message["worker"], message["player"]))
+            room = self.rooms.get(message["room"])
+            if player is not None and room is not None:
+                self.multi_player_guess(player, room, message["guess"])
+        elif op == "subscribed":
+            player = self.remote_players.get((message["worker"], message["player"]))
+            if player is not None:
+                player.subscribed = True
+        elif op == "leave":
+            player = self.remote_players.pop((message["worker"], message["player"]), None)
+            room = self.rooms.get(message["room"])
+            if player is not None and room is not None:
+                self.leave_multi_player(player, room)
+
+    # ---- 'threads' backend: a bounded pool of reused worker threads ----
+
+    def serve_threads(self):
+        # At most max_connections clients are served at once. When all workers are busy the accept loop waits,
+        # so new clients queue in the kernel's listen backlog instead of spawning more threads.
+        # Each client also has a writer thread draining its outbound queue.
+        slots = threading.BoundedSemaphore(self.max_connections)
+        with ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix='client') as pool, \
+                ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix='writer') as writers:
+            while True:
+                slots.acquire()
+                try:
+                    connection, address = self.server_socket.accept()
+                    logging.info(f"Connected by {address}")
+                    pool.submit(self.handle_client, connection, address, slots, writers)
+                except Exception as e:
+                    slots.release()
+                    logging.error(f"Error accepting connection: {e}")
+
+    def handle_client(self, connection, address, slots, writers):
+        try:
+            # TLS handshake runs in the worker, so a slow client can't hold up the accept loop
+            with self.context.wrap_socket(connection, server_side=True) as tls_connection:
+                self.handshake_stats.record(tls_connection)
+                client = ThreadConnection(self, MessageStream(tls_connection), address)
+                writer = writers.submit(client.outbound.run)
+                try:
+                    self.serve_client(client)
+                finally:
+                    # Let the writer send what is still queued (e.g. the last reply) before the socket is closed
+                    client.outbound.close()
+                    if wait([writer], timeout=5).not_done:
+                        client.outbound.abort()
+        except ConnectionError as e:
+            logging.info(f"Unexpected Error: {e}")
+        except ssl.SSLError as e:
+            logging.error(f"SSL error: {e}")
+        except Exception as e:
+            logging.error(f"Error handling client: {e}")
+        finally:
+            connection.close()
+            slots.release()
+
+    def serve_client(self, client):
+        session = ClientSession(self, client)
+        try:
+            session.start()
+            while True:
+                try:
+                    data_json = client.stream.recv()
+                except ValueError as e:
+                    session.handle_malformed(e)
+                    continue
+                if data_json is None:
+                    raise ConnectionError("Client disconnected unexpectedly.")
+                if not session.handle(data_json):
+                    break
+        finally:
+            session.close()
+
+    # ---- 'selectors' backend: every client on one non-blocking event loop ----
+
+    def serve_selectors(self):
+        self.selector = selectors.DefaultSelector()
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ, None)
+        if self.route_socket is not None:
+            # ZeroMQ signals its descriptor on edges only, so the routing socket is also checked after every batch
+            self.selector.register(self.route_socket.getsockopt(zmq.FD), selectors.EVENT_READ, self.route_socket)
+        while True:
+            for key, mask in self.selector.select():
+                if key.data is None:
+                    self.accept_event_connection()
+                elif key.data is self.route_socket:
+                    self.process_routes()
+                else:
+                    self.service(key.data, mask)
+            if self.route_socket is not None:
+                self.process_routes()
+            # Clients whose writes failed (possibly while a broadcast held the multiplayer lock) are closed here
+            while self.failed_connections:
+                self.close_event_connection(self.failed_connections.pop())
+
+    def accept_event_connection(self):
+        try:
+            connection, address = self.server_socket.accept()
+        except BlockingIOError:
+            return
+        logging.info(f"Connected by {address}")
+        connection.setblocking(False)
+        tls_connection = self.context.wrap_socket(connection, server_side=True, do_handshake_on_connect=False)
+        client = EventConnection(self, tls_connection, address)
+        self.active_connections += 1
+        # Connection limit reached: stop accepting until a client leaves
+        if self.active_connections >= self.max_connections:
+            self.selector.unregister(self.server_socket)
+        self.update_events(client, selectors.EVENT_READ)
+
+    def update_events(self, client, events):
+        if client.closed or events == client.events:
+            return
+        if client.events == 0:
+            self.selector.register(client.sock, events, client)
+        elif events == 0:
+            self.selector.unregister(client.sock)
+        else:
+            self.selector.modify(client.sock, events, client)
+        client.events = events
+
+    def wanted_events(self, client):
+        # Read unless the client is too far behind on its output (backpressure), write while output is pending
+        events = 0
+        if len(client.out_buffer) < self.max_buffered_bytes:
+            events |= selectors.EVENT_READ
+        if client.out_buffer:
+            events |= selectors.EVENT_WRITE
+        return events
+
+    def service(self, client, mask):
+        try:
+            if client.handshaking:
+                self.continue_handshake(client)
+            else:
+                if mask & selectors.EVENT_WRITE:
+                    self.flush(client)
+                if mask & selectors.EVENT_READ:
+                    self.read_messages(client)
+        except ConnectionError as e:
+            logging.info(f"Unexpected Error: {e}")
+            self.close_event_connection(client)
+        except Exception as e:
+            # Whatever goes wrong with one client only closes that client's connection, not the event loop
+            logging.error(f"Error handling client: {e}")
+            self.close_event_connection(client)
+
+    def continue_handshake(self, client):
+        try:
+            client.sock.do_handshake()
+        except ssl.SSLWantReadError:
+            self.update_events(client, selectors.EVENT_READ)
+            return
+        except ssl.SSLWantWriteError:
+            self.update_events(client, selectors.EVENT_WRITE)
+            return
+        client.handshaking = False
+        self.handshake_stats.record(client.sock)
+        client.session = ClientSession(self, client)
+        client.session.start()
+        self.update_events(client, self.wanted_events(client))
+
+    def read_messages(self, client):
+        # Read everything the socket (and OpenSSL's buffer) has, then handle every complete message.
+        # Reading stops being scheduled while the client's output is backed up (see wanted_events).
+        while True:
+            try:
+                data = client.sock.recv(65536)
+            except (ssl.SSLWantReadError, ssl.SSLWantWriteError, BlockingIOError):
+                break
+            if not data:
+                raise ConnectionError("Client disconnected unexpectedly.")
+            client.decoder.feed(data)
+        while not client.closed:
+            try:
+                data_json = client.decoder.next_message()
+            except ValueError as e:
+                client.session.handle_malformed(e)
+                continue
+            if data_json is None:
+                break
+            if not client.session.handle(data_json):
+                self.close_event_connection(client)
+                return
+
+    def flush(self, client):
+        # Write as much pending output as the socket takes without blocking
+        if client.handshaking or client.closed:
+            return
+        try:
+            while client.out_buffer:
+                sent = client.sock.send(client.out_buffer)
+                del client.out_buffer[:sent]
+        except (ssl.SSLWantWriteError, ssl.SSLWantReadError, BlockingIOError):
+            pass
+        except (ssl.SSLError, OSError) as e:
+            logging.error(f"Error sending message to client: {e}")
+            client.out_buffer.clear()
+            self.failed_connections.append(client)
+            return
+        self.update_events(client, self.wanted_events(client))
+
+    def close_event_connection(self, client):
+        if client.closed:
+            return
+        if client.session is not None:
+            client.session.close()
+        self.update_events(client, 0)
+        client.closed = True
+        client.sock.close()
+        self.active_connections -= 1
+        if self.active_connections == self.max_connections - 1:
+            self.selector.register(self.server_socket, selectors.EVENT_READ, None)
+
+
+# Function run by every worker process of serve_workers
+def run_worker(worker_id, stats_queue, options):
+    try:
+        server = GameServer(worker_id=worker_id, **options)
+        report_stats(stats_queue, worker_id, server.stats_snapshot)
+        server.start()
+    except Exception as e:
+        logging.error(f"Worker {worker_id} error: {e}")
+        # A non-zero exit code makes the supervisor wait before starting the worker again
+        sys.exit(1)
+
+
+# Function to run the server as several worker processes sharing the port (SO_REUSEPORT).
+# The supervisor starts workers that die again and sums their counters; this process also forwards the room
+# events of every worker to the PUB port that clients subscribe to.
+def serve_workers(workers, options):
+    options = dict(options, workers=workers)
+    zmq_pub_port = options.get('zmq_pub_port', 5557)
+    zmq_context = zmq.Context()
+    xsub = zmq_context.socket(zmq.XSUB)
+    xsub.bind(f"tcp://127.0.0.1:{zmq_pub_port + 1}")
+    xpub = zmq_context.socket(zmq.XPUB)
+    xpub.bind(f"tcp://*:{zmq_pub_port}")
+    threading.Thread(target=zmq.proxy, args=(xsub, xpub), name='events', daemon=True).start()
+    Supervisor(run_worker, workers, (options,)).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the number guessing game server.')
+    # Using --backend option to pick a bounded thread pool or a single non-blocking event loop
+    parser.add_argument('--backend', choices=['threads', 'selectors'], default='threads')
+    parser.add_argument('--max-connections', metavar='N', type=int, default=1024)
+    # Using --room-size option to cap the number of players in one multiplayer room
+    parser.add_argument('--room-size', metavar='N', type=int, default=16)
+    # Using --max-queued-bytes and --slow-consumer options to bound each client's unsent output and pick what
+    # happens to a client that can't keep up with broadcasts
+    parser.add_argument('--max-queued-bytes', metavar='N', type=int, default=256 * 1024)
+    parser.add_argument('--slow-consumer', choices=SLOW_CONSUMER_POLICIES, default=DROP)
+    # Using --workers option to run several server processes on the same port, each owning some of the rooms
+    parser.add_argument('--workers', metavar='N', type=int, default=1)
+    args = parser.parse_args()
+    options = {'backend': args.backend, 'max_connections': args.max_connections, 'room_size': args.room_size,
+               'max_buffered_bytes': args.max_queued_bytes, 'slow_consumer': args.slow_consumer}
+    try:
+        if args.workers > 1:
+            serve_workers(args.workers, options)
+        else:
+            GameServer(**options).start()
+    except Exception as e:
+        logging.error(f"Server error: {e}")
@@ -0,0 +1,108 @@
+import ast
+import random
+
+# Guessing strategies for headless players. A strategy is asked for a guess with next_guess(), told the server's
+# answer with feedback(message), and reset() before every new game.
+STRATEGIES = ('binary', 'random', 'replay')
+
+
+class BinarySearch:
+    def __init__(self, low=1, high=10):
+        # Guess with binary search, so every game finishes in the minimum number of guesses
+        self.start_low = low
+        self.start_high = high
+        self.reset()
+
+    def reset(self):
+        self.low = self.start_low
+        self.high = self.start_high
+        self.guess = None
+
+    def next_guess(self):
+        self.guess = (self.low + self.high) // 2
+        return self.guess
+
+    def feedback(self, message):
+        if not isinstance(self.guess, int):
+            return
+        if "too small" in message:
+            self.low = self.guess + 1
+        elif "too high" in message:
+            self.high = self.guess - 1
+        # Hints that contradict each other (e.g. the number changed in a multiplayer round) start the search over
+        if self.low > self.high:
+            self.reset()
+
+
+class RandomGuess(BinarySearch):
+    def __init__(self, low=1, high=10, seed=None):
+        # Guess at random, but only numbers that the hints so far haven't ruled out
+        self.random = random.Random(seed)
+        super().__init__(low, high)
+
+    def next_guess(self):
+        self.guess = self.random.randint(self.low, self.high)
+        return self.guess
+
+
+class Replay(BinarySearch):
+    def __init__(self, games, low=1, high=10):
+        # Play the guesses of recorded games again, one recorded game per game played (cycling through them).
+        # When a recorded game runs out of guesses the game is finished with binary search.
+        self.games = [list(guesses) for guesses in games]
+        self.game_index = -1
+        self.played = False
+        super().__init__(low, high)
+
+    def reset(self):
+        super().reset()
+        # Move on to the next recorded game only once the current one has been played
+        if self.game_index < 0 or self.played:
+            self.game_index += 1
+            self.pending = list(self.games[self.game_index % len(self.games)]) if self.games else []
+        self.played = False
+
+    def next_guess(self):
+        self.played = True
+        if self.pending:
+            self.guess = self.pending.pop(0)
+            return self.guess
+        return super().next_guess()
+
+
+# Function to get the guesses of one recorded game from its history messages.
+# Client logs record "Client: 5", server logs "Client: {'guess': '5'}"; guesses that aren't numbers are kept
+# as they were typed, so replaying them exercises the server's invalid input handling too.
+def recorded_guesses(messages):
+    guesses = []
+    for item in messages:
+        if not item.startswith("Client: "):
+            continue
+        text = item[len("Client: "):]
+        if text.startswith('{'):
+            try:
+                text = ast.literal_eval(text).get('guess')
+            except (ValueError, SyntaxError, AttributeError):
+                continue
+            if text is None:
+                continue
+        elif text == "start.":
+            continue
+        try:
+            guesses.append(int(text))
+        except (ValueError, TypeError):
+            guesses.append(text)
+    return guesses
+
+
+# Function to create a strategy by name ('replay' needs the recorded games as lists of guesses)
+def make_strategy(name, replay_games=None, seed=None):
+    if name == 'binary':
+        return BinarySearch()
+    if name == 'random':
+        return RandomGuess(seed=seed)
+    if name == 'replay':
+        if not replay_games:
+            raise ValueError("The replay strategy needs at least one recorded game.")
+        return Replay(replay_games)
+    raise ValueError(f"Unknown strategy {name}.")
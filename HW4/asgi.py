@@ -0,0 +1,16 @@
+# asgi.py
+# ASGI entry point for serving the game with several worker processes, e.g. from the HW4 directory:
+#
+#     pip install uvicorn a2wsgi
+#     uvicorn asgi:application --workers 4 --host 0.0.0.0 --port 8000 --backlog 4096
+#
+# Each worker's event loop holds the client connections (idle keep-alive connections cost no thread), and
+# the Flask views with their blocking SQLite calls run on a thread pool, off the event loop. The pool has as
+# many threads as game_db.pool has connections (GAME_DB_POOL_SIZE), so a request never waits for a connection.
+# Templates, sessions and CSRF are the same as with `python app.py`: the signed session cookie works on
+# every worker. Leave GAME_CACHE_TTL unset with more than one worker, since each worker would have its own cache.
+from a2wsgi import WSGIMiddleware
+from app import app
+from game_db import pool
+
+application = WSGIMiddleware(app, workers=pool.size)
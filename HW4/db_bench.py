@@ -0,0 +1,113 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from game_db import MIGRATIONS, connect, migrate
+
+# The queries every /game request runs
+HOT_QUERIES = {
+    'active_game': 'SELECT * FROM games WHERE user_id = ? AND finished = 0',
+    'user_score': 'SELECT score FROM users WHERE username = ?',
+}
+
+
+# Nearest-rank percentile, the same definition as bench.py uses, so the two reports compare
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index] * 1000, 3)
+
+
+def latency_summary(samples):
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50),
+        'p99_ms': percentile(samples, 99),
+        'p999_ms': percentile(samples, 99.9),
+        'max_ms': round(max(samples) * 1000, 3) if samples else None,
+    }
+
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+# Fill a database at schema version 1 (no indexes) with `games` finished games and one active game per user
+def build_database(path, games, users):
+    remove_database(path)
+    conn = connect(path)
+    migrate(conn, target=1)
+    names = [f"user{number}" for number in range(users)]
+    conn.executemany('INSERT INTO users (username, password, score) VALUES (?, ?, ?)',
+                     ((name, 'password', 0) for name in names))
+    conn.executemany('INSERT INTO games (user_id, number, attempts, finished) VALUES (?, ?, ?, ?)',
+                     ((names[number % users], random.randint(1, 10), random.randint(1, 5), 1)
+                      for number in range(games)))
+    conn.executemany('INSERT INTO games (user_id, number, attempts, finished) VALUES (?, ?, ?, ?)',
+                     ((name, random.randint(1, 10), 0, 0) for name in names))
+    conn.commit()
+    return conn, names
+
+
+def time_queries(conn, names, lookups):
+    results = {}
+    for label, query in HOT_QUERIES.items():
+        samples = []
+        for _ in range(lookups):
+            name = random.choice(names)
+            started = time.perf_counter()
+            conn.execute(query, (name,)).fetchall()
+            samples.append(time.perf_counter() - started)
+        results[label] = latency_summary(samples)
+    return results
+
+
+def run_benchmark(args):
+    started = time.perf_counter()
+    conn, names = build_database(args.path, args.games, args.users)
+    build_s = time.perf_counter() - started
+
+    before = time_queries(conn, names, args.lookups)
+    started = time.perf_counter()
+    version = migrate(conn)
+    migrate_s = time.perf_counter() - started
+    after = time_queries(conn, names, args.lookups)
+    plans = {label: [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, (names[0],))]
+             for label, query in HOT_QUERIES.items()}
+    conn.close()
+    if not args.keep:
+        remove_database(args.path)
+
+    return {
+        'config': {'games': args.games, 'users': args.users, 'lookups': args.lookups},
+        'build_s': round(build_s, 3),
+        'unindexed': before,
+        'migration': {'to_version': version, 'of': len(MIGRATIONS), 'seconds': round(migrate_s, 3)},
+        'indexed': after,
+        'query_plans': plans,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure the /game queries on a large game.db, '
+                                                 'before and after the index migrations.')
+    parser.add_argument('--games', type=int, default=1000000, help='historical (finished) games')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--lookups', type=int, default=200, help='queries timed per query and schema version')
+    parser.add_argument('--path', default='bench_game.db', help='database file to build (replaced if it exists)')
+    parser.add_argument('--keep', action='store_true', help="don't delete the database afterwards")
+    parser.add_argument('--output', metavar='file', default=None, help='also write the JSON report here')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
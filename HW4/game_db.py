@@ -1,33 +1,362 @@
-# game_db.py
-import sqlite3
-
-def init_db():
-    with sqlite3.connect('game.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                username TEXT NOT NULL,
-                password TEXT NOT NULL,
-                score INTEGER DEFAULT 0  -- Add score column
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS games (
-                id INTEGER PRIMARY KEY,
-                user_id TEXT,
-                number INTEGER,
-                attempts INTEGER,
-                finished INTEGER,
-                FOREIGN KEY(user_id) REFERENCES users(username)
-            )
-        ''')
-        conn.commit()
-
-def get_db_connection():
-    conn = sqlite3.connect('game.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-# Initialize the database
-init_db()
+# game_db.py
+import atexit
+import contextlib
+import os
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+DB_PATH = 'game.db'
+MAX_ATTEMPTS = 5
+
+
+def configure_connection(conn):
+    # Settings that are paid for once per connection instead of once per request
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')  # Readers don't block the writer and vice versa
+    conn.execute('PRAGMA synchronous = NORMAL')  # Safe with WAL; fsync at checkpoints instead of every commit
+    conn.execute('PRAGMA busy_timeout = 5000')  # Wait for a concurrent writer instead of failing right away
+    return conn
+
+
+def connect(path=DB_PATH):
+    # check_same_thread=False: a pooled connection is used by one request at a time, but not always
+    # by the thread that created it. Prepared statements are kept in the per-connection statement cache.
+    conn = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+    return configure_connection(conn)
+
+
+class ConnectionPool:
+    def __init__(self, path=DB_PATH, size=8, timeout=30):
+        # Bounded pool: at most `size` connections, opened on first use and reused by later requests
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()  # Most recently used first, its pages are still in the cache
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.opened < self.size:
+                self.opened += 1
+                open_new = True
+            else:
+                open_new = False
+        if open_new:
+            try:
+                return connect(self.path)
+            except sqlite3.Error:
+                with self.lock:
+                    self.opened -= 1
+                raise
+        # Every connection is in use: wait for one to be returned
+        try:
+            return self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No database connection available after {self.timeout} seconds")
+
+    def release(self, conn):
+        # A request that failed halfway must not leave its transaction open for the next one
+        if conn.in_transaction:
+            conn.rollback()
+        self.idle.put(conn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self.lock:
+                self.opened -= 1
+
+
+# Schema migrations, in order. PRAGMA user_version holds how many of them a database file has applied,
+# so init_db upgrades an existing game.db in place and only runs the steps it is missing.
+MIGRATIONS = [
+    # 1: the original tables
+    ['''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL,
+            score INTEGER DEFAULT 0  -- Add score column
+        )
+    ''', '''
+        CREATE TABLE IF NOT EXISTS games (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT,
+            number INTEGER,
+            attempts INTEGER,
+            finished INTEGER,
+            FOREIGN KEY(user_id) REFERENCES users(username)
+        )
+    '''],
+    # 2: one row per username (merging the scores of duplicates from concurrent logins first), which also
+    # indexes the username lookup of every request
+    ['''
+        UPDATE users SET score = (SELECT SUM(score) FROM users AS same WHERE same.username = users.username)
+        WHERE id IN (SELECT MIN(id) FROM users GROUP BY username)
+    ''', '''
+        DELETE FROM users WHERE id NOT IN (SELECT MIN(id) FROM users GROUP BY username)
+    ''', '''
+        CREATE UNIQUE INDEX IF NOT EXISTS users_username ON users(username)
+    '''],
+    # 3: the active game lookup (user_id = ? AND finished = 0). Partial, so finished games, which are
+    # almost all of the table, aren't indexed at all.
+    ['''
+        CREATE INDEX IF NOT EXISTS games_active ON games(user_id) WHERE finished = 0
+    '''],
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=len(MIGRATIONS)):
+    # Apply the missing migrations up to `target`, each in its own transaction together with its version
+    # number. BEGIN IMMEDIATE makes processes starting at the same time run each step only once.
+    while schema_version(conn) < target:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = schema_version(conn)
+            if version < target:
+                for statement in MIGRATIONS[version]:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return schema_version(conn)
+
+
+def init_db(path=DB_PATH):
+    conn = sqlite3.connect(path)
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+
+def get_db_connection():
+    # A new connection that the caller closes; requests borrow from `pool` instead
+    return connect()
+
+
+# Game data access used by app.py. Each function is one transaction with as few statements as possible,
+# because every commit is an fsync of the WAL.
+
+def new_game(conn, username):
+    # Returns the id and the number of the new game
+    number = random.randint(1, 10)
+    cursor = conn.execute('INSERT INTO games (user_id, number, attempts, finished) VALUES (?, ?, 0, 0)',
+                          (username, number))
+    return cursor.lastrowid, number
+
+
+def login_user(conn, username, password):
+    # Create the user on its first login (OR IGNORE: it may exist already) and start a new game
+    conn.execute('INSERT OR IGNORE INTO users (username, password, score) VALUES (?, ?, 0)', (username, password))
+    new_game(conn, username)
+    conn.commit()
+
+
+def user_score(conn, username):
+    row = conn.execute('SELECT score FROM users WHERE username = ?', (username,)).fetchone()
+    return row['score'] if row else 0
+
+
+def active_attempts(conn, username):
+    # Attempts of the user's active game, or None without one
+    row = conn.execute('''
+        SELECT attempts FROM games WHERE user_id = ? AND finished = 0 ORDER BY id LIMIT 1
+    ''', (username,)).fetchone()
+    return row['attempts'] if row else None
+
+
+def game_state(conn, username):
+    # Score and attempts of the active game, starting a new game when there is none. Returns (score, attempts).
+    attempts = active_attempts(conn, username)
+    if attempts is None:
+        new_game(conn, username)
+        conn.commit()
+        attempts = 0
+    return user_score(conn, username), attempts
+
+
+def play_turn(conn, username, guess):
+    # Count one guess in the active game and finish the game when it is right or the last attempt,
+    # all in one UPDATE ... RETURNING. Returns (outcome, score, attempts) where outcome is 'won', 'lost',
+    # 'low' or 'high', and attempts is that of the active game afterwards (0 once the game is over).
+    turn = conn.execute('''
+        UPDATE games SET attempts = attempts + 1,
+                         finished = (number = :guess OR attempts + 1 >= :max_attempts)
+        WHERE id = (SELECT id FROM games WHERE user_id = :username AND finished = 0 ORDER BY id LIMIT 1)
+        RETURNING number, attempts, finished
+    ''', {'guess': guess, 'max_attempts': MAX_ATTEMPTS, 'username': username}).fetchone()
+    if turn is None:
+        # No active game yet: start one and play the guess in it
+        new_game(conn, username)
+        return play_turn(conn, username, guess)
+
+    if guess == turn['number']:
+        outcome = 'won'
+        row = conn.execute('UPDATE users SET score = score + 1 WHERE username = ? RETURNING score',
+                           (username,)).fetchone()
+        score = row['score'] if row else 1
+    else:
+        outcome = 'lost' if turn['finished'] else ('low' if guess < turn['number'] else 'high')
+        score = user_score(conn, username)
+    conn.commit()
+    return outcome, score, 0 if turn['finished'] else turn['attempts']
+
+
+class GameCache:
+    def __init__(self, pool, ttl=1800, flush_every=1.0):
+        # Active games kept in memory by username, with the same functions as above (login_user, game_state,
+        # play_turn), so a guess doesn't touch SQLite. Finished games and score increments are written through;
+        # the attempts of running games are written behind every flush_every seconds. Games idle for ttl
+        # seconds are flushed and dropped, and a restart reloads them from SQLite.
+        # The cache belongs to one process, so run a single worker (or sticky sessions) when it is on.
+        self.pool = pool
+        self.ttl = ttl
+        self.flush_every = flush_every
+        self.games = {}
+        self.lock = threading.Lock()
+        threading.Thread(target=self.run, name='game-cache', daemon=True).start()
+        atexit.register(self.flush)
+
+    def load(self, conn, username):
+        # The user's active game and score from SQLite, starting a new game when there is none
+        row = conn.execute('''
+            SELECT id, number, attempts FROM games WHERE user_id = ? AND finished = 0 ORDER BY id LIMIT 1
+        ''', (username,)).fetchone()
+        if row is None:
+            game_id, number = new_game(conn, username)
+            conn.commit()
+            game = {'id': game_id, 'number': number, 'attempts': 0}
+        else:
+            game = dict(row)
+        game.update(score=user_score(conn, username), dirty=False, used=time.monotonic())
+        with self.lock:
+            # Another request of the same user may have loaded it first
+            return self.games.setdefault(username, game)
+
+    def get(self, conn, username):
+        with self.lock:
+            game = self.games.get(username)
+            if game is not None:
+                game['used'] = time.monotonic()
+                return game
+        return self.load(conn, username)
+
+    def login_user(self, conn, username, password):
+        with self.lock:
+            game = self.games.pop(username, None)
+        if game is not None and game['dirty']:
+            self.write_attempts(conn, [game])
+        login_user(conn, username, password)
+
+    def game_state(self, conn, username):
+        game = self.get(conn, username)
+        return game['score'], game['attempts']
+
+    def play_turn(self, conn, username, guess):
+        # Same result as play_turn() above; only a finished game goes to SQLite, in one transaction that also
+        # starts the next game
+        while True:
+            game = self.get(conn, username)
+            with self.lock:
+                # A concurrent turn may have finished this game (or a login dropped it) since it was fetched,
+                # so play on the current game instead of changing the stale one
+                if self.games.get(username) is not game:
+                    continue
+                game['attempts'] += 1
+                won = guess == game['number']
+                finished = won or game['attempts'] >= MAX_ATTEMPTS
+                if not finished:
+                    game['dirty'] = True
+                    return ('low' if guess < game['number'] else 'high'), game['score'], game['attempts']
+                finished_game = dict(game)
+                del self.games[username]
+
+            # Until this commits, another request may reload the game from SQLite; whichever finishes it second
+            # updates no row and plays on the next game instead
+            updated = conn.execute('UPDATE games SET attempts = ?, finished = 1 WHERE id = ? AND finished = 0',
+                                   (finished_game['attempts'], finished_game['id'])).rowcount
+            if updated:
+                break
+            conn.rollback()
+            with self.lock:
+                if self.games.get(username) is game:
+                    del self.games[username]
+
+        score = finished_game['score']
+        if won:
+            row = conn.execute('UPDATE users SET score = score + 1 WHERE username = ? RETURNING score',
+                               (username,)).fetchone()
+            score = row['score'] if row else score + 1
+        game_id, number = new_game(conn, username)
+        conn.commit()
+        with self.lock:
+            self.games.setdefault(username, {'id': game_id, 'number': number, 'attempts': 0, 'score': score,
+                                             'dirty': False, 'used': time.monotonic()})
+        return ('won' if won else 'lost'), score, 0
+
+    def write_attempts(self, conn, games):
+        # finished = 0: a game finished in the meantime already has its final attempts
+        conn.executemany('UPDATE games SET attempts = ? WHERE id = ? AND finished = 0',
+                         [(game['attempts'], game['id']) for game in games])
+        conn.commit()
+
+    def flush(self):
+        # Write the attempts of every changed game and drop games that have been idle for ttl seconds
+        expired = time.monotonic() - self.ttl
+        with self.lock:
+            dirty = {}
+            for username, game in list(self.games.items()):
+                if game['dirty']:
+                    game['dirty'] = False
+                    dirty[username] = {'id': game['id'], 'attempts': game['attempts']}
+                if game['used'] < expired:
+                    del self.games[username]
+        if not dirty:
+            return
+        try:
+            with self.pool.connection() as conn:
+                self.write_attempts(conn, list(dirty.values()))
+        except sqlite3.Error as e:
+            print(f"Game cache flush failed, retrying later: {e}", file=sys.stderr)
+            with self.lock:
+                for username, written in dirty.items():
+                    game = self.games.get(username)
+                    if game is not None and game['id'] == written['id']:
+                        game['dirty'] = True
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_every)
+            self.flush()
+
+
+# GAME_DB_POOL_SIZE sets how many connections each process keeps (and, in asgi.py, how many request threads)
+pool = ConnectionPool(size=int(os.environ.get('GAME_DB_POOL_SIZE', 8)))
@@ -0,0 +1,113 @@
+# scrape_cache.py
+import sqlite3
+import threading
+import time
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    # One cache key per page: lower-case scheme and host, no default port or fragment, and the path
+    # percent-encoded the same way however it was written
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = quote(unquote(parts.path), safe="/:@!$&'()*+,;=-._~") or '/'
+    return urlunsplit((scheme, host, path, parts.query, ''))
+
+
+class ScrapeCache:
+    def __init__(self, path='scrape_cache.db', max_bytes=100 * 1024 * 1024, max_age=24 * 3600):
+        # What was extracted from every page (title, first paragraph) with the page's ETag and Last-Modified.
+        # An entry younger than max_age seconds is used without asking the server; an older one is revalidated
+        # with a conditional GET. Least recently used entries go once the entries take more than max_bytes.
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                title TEXT NOT NULL,
+                first_paragraph TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_used_at ON pages(used_at)')
+        self.conn.commit()
+        self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def get(self, url):
+        # The cached entry of a page as a dictionary with 'fresh' set when it needs no revalidation, or None
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM pages WHERE url = ?', (normalize_url(url),)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute('UPDATE pages SET used_at = ? WHERE url = ?', (now, row['url']))
+            self.conn.commit()
+        entry = dict(row)
+        entry['fresh'] = now - entry['fetched_at'] < self.max_age
+        return entry
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def revalidated(self, url, response):
+        # 304 Not Modified: the entry is fresh again (with the validators the server sent, if any)
+        with self.lock:
+            self.conn.execute('''
+                UPDATE pages SET fetched_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)
+                WHERE url = ?
+            ''', (time.time(), response.headers.get('ETag'), response.headers.get('Last-Modified'), normalize_url(url)))
+            self.conn.commit()
+
+    def put(self, url, response, title, first_paragraph):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            return
+        key = normalize_url(url)
+        size = len(key) + len(title.encode()) + len(first_paragraph.encode()) + len(etag or '') + len(last_modified or '')
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT size FROM pages WHERE url = ?', (key,)).fetchone()
+            self.conn.execute('''
+                INSERT OR REPLACE INTO pages (url, etag, last_modified, title, first_paragraph, size, fetched_at, used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, etag, last_modified, title, first_paragraph, size, now, now))
+            self.size += size - (row['size'] if row else 0)
+            if self.size > self.max_bytes:
+                self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        # Drop least recently used entries until the cache is back to 90% of max_bytes
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute('SELECT url, size FROM pages ORDER BY used_at')
+        evicted = []
+        for row in rows:
+            if self.size <= target:
+                break
+            evicted.append((row['url'],))
+            self.size -= row['size']
+        self.conn.executemany('DELETE FROM pages WHERE url = ?', evicted)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,57 @@
+# scrape_store.py
+import csv
+import sqlite3
+import time
+from scrape_cache import normalize_url
+
+
+class PageStore:
+    def __init__(self, path='scraped_pages.db', batch_size=500):
+        # Every scraped page, one row per URL: scraping a page again updates its row instead of adding one.
+        # Rows are buffered and written batch_size at a time in one transaction.
+        self.batch_size = batch_size
+        self.pending = []
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                first_paragraph TEXT NOT NULL,
+                scraped_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def add(self, url, title, first_paragraph):
+        self.pending.append((normalize_url(url), title, first_paragraph, time.time()))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        # A page that didn't change keeps its row as it is, so re-scraping doesn't rewrite it
+        self.conn.executemany('''
+            INSERT INTO pages (url, title, first_paragraph, scraped_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET title = excluded.title, first_paragraph = excluded.first_paragraph,
+                                           scraped_at = excluded.scraped_at
+            WHERE title != excluded.title OR first_paragraph != excluded.first_paragraph
+        ''', self.pending)
+        self.conn.commit()
+        self.pending = []
+
+    def export_csv(self, path='Wikipedia_Content.csv'):
+        # Same columns as before, one row per page in the order the pages were first scraped.
+        # Rows are streamed from the database, so the export doesn't hold them all in memory.
+        self.flush()
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Title', 'First Paragraph'])
+            writer.writerows(self.conn.execute('SELECT title, first_paragraph FROM pages ORDER BY id'))
+
+    def close(self):
+        self.flush()
+        self.conn.close()
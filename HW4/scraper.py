@@ -1,55 +1,635 @@
-import requests
-from bs4 import BeautifulSoup
-import csv
-import re
-
-
-def get_wikipedia_url():
-    while True:
-        url = input("Wikipedia URL: ")
-        if validate_wikipedia_url(url):
-            return url
-        else:
-            print("Invalid Wikipedia URL. Please try again.")
-
-
-def validate_wikipedia_url(url):
-    pattern = re.compile(r"^https?://(en\.)?wikipedia\.org/wiki/.+$")
-    return bool(pattern.match(url))
-
-
-def scrape_wikipedia_page(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    title = soup.find('h1', {'id': 'firstHeading'}).text
-    paragraphs = soup.find_all('p')
-    first_paragraph = ""
-
-    for paragraph in paragraphs:
-        if paragraph.text.strip():
-            first_paragraph = paragraph.text.strip()
-            break
-
-    return title, first_paragraph
-
-
-def save_to_csv(data):
-    with open('Wikipedia_Content.csv', 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Title', 'First Paragraph'])
-        writer.writerow(data)
-
-
-def main():
-    url = get_wikipedia_url()
-    title, first_paragraph = scrape_wikipedia_page(url)
-
-    print(f"Title: {title}")
-    print(f"Description: {first_paragraph}")
-
-    save_to_csv((title, first_paragraph))
-
-
-if __name__ == "__main__":
-    main()
+import argparse
+import codecs
+import html
+import multiprocessing
+import os
+import requests
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.dammit import EncodingDetector, EntitySubstitution
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from html.parser import HTMLParser
+from scrape_cache import ScrapeCache
+from scrape_store import PageStore
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlsplit, urlunsplit
+
+USER_AGENT = 'NetworkProgramming-HW4-scraper/1.0 (python-requests)'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 16 * 1024
+# After the title and first paragraph are found, a body with at most this many bytes left is still read, so the
+# connection can be reused; a longer one is closed instead
+DRAIN_BYTES = 64 * 1024
+# Pages are sent to the parse processes in batches of up to this many pages or bytes
+PARSE_BATCH_PAGES = 16
+PARSE_BATCH_BYTES = 4 * 1024 * 1024
+
+# BeautifulSoup's html.parser rules, so PageExtractor finds the same text as extract_page
+_TREE_BUILDER = HTMLParserTreeBuilder()
+EMPTY_ELEMENT_TAGS = _TREE_BUILDER.empty_element_tags
+STRING_CONTAINERS = set(_TREE_BUILDER.string_containers)  # Their strings aren't part of .text
+PRESERVE_WHITESPACE_TAGS = _TREE_BUILDER.preserve_whitespace_tags
+ASCII_SPACES = BeautifulSoup.ASCII_SPACES
+# The number of a numeric character reference as html.parser reports it, and any data that follows it
+CHARREF = re.compile(r'([xX][0-9a-fA-F]+|[0-9]+)(.*)', re.DOTALL)
+
+
+def get_wikipedia_url():
+    while True:
+        url = input("Wikipedia URL: ")
+        if validate_wikipedia_url(url):
+            return url
+        else:
+            print("Invalid Wikipedia URL. Please try again.")
+
+
+def validate_wikipedia_url(url):
+    pattern = re.compile(r"^https?://(en\.)?wikipedia\.org/wiki/.+$")
+    return bool(pattern.match(url))
+
+
+def create_session(pool_size=10):
+    # One session for every request, so connections are kept alive and reused between pages
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_page(session, url, retries=3, backoff=0.5, timeout=10, stats=None, stream=False, headers=None):
+    # GET with retries on connection errors, timeouts, 429 and 5xx, waiting backoff, 2*backoff, 4*backoff, ...
+    # (or the server's Retry-After) between attempts
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, timeout=timeout, stream=stream, headers=headers)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                if not response.ok:
+                    response.close()
+                response.raise_for_status()
+                return response
+            delay = retry_after(response) or backoff * 2 ** attempt
+            response.close()
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+        if stats is not None:
+            stats.retried()
+        time.sleep(delay)
+
+
+def retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_page(content):
+    soup = BeautifulSoup(content, 'html.parser')
+
+    title = soup.find('h1', {'id': 'firstHeading'}).text
+    paragraphs = soup.find_all('p')
+    first_paragraph = ""
+
+    for paragraph in paragraphs:
+        if paragraph.text.strip():
+            first_paragraph = paragraph.text.strip()
+            break
+
+    return title, first_paragraph
+
+
+class PageExtractor(HTMLParser):
+    def __init__(self):
+        # Event-based version of extract_page: the same tokenizer and the same rules as BeautifulSoup's
+        # html.parser tree for entities, whitespace-only strings and which strings are text, but without
+        # building the tree. `done` is set as soon as the title and the first paragraph are known.
+        super().__init__(convert_charrefs=False)
+        self.stack = []  # Open elements as (name, text buffer of a <p> or the title heading, or None)
+        self.open_counts = Counter()
+        self.already_closed = []
+        self.data = []
+        self.containers = 0
+        self.preserve_whitespace = 0
+        self.captures = []
+        self.open_paragraphs = 0
+        self.heading_found = False
+        self.title = None
+        self.first_paragraph = None
+        self.decoder = None
+        self.head = b''
+
+    @property
+    def done(self):
+        return self.title is not None and self.first_paragraph is not None
+
+    def feed_bytes(self, chunk, final=False):
+        # The encoding is a byte order mark, or else a charset declared in the first 2 KB (where BeautifulSoup
+        # looks for it too), or else UTF-8. Raises UnicodeDecodeError if the page isn't in that encoding, and
+        # LookupError if Python doesn't know the declared one.
+        if self.decoder is None:
+            self.head += chunk
+            if len(self.head) < 2048 and not final:
+                return
+            chunk, encoding = EncodingDetector.strip_byte_order_mark(self.head)
+            encoding = encoding or EncodingDetector.find_declared_encoding(chunk, is_html=True) or 'utf-8'
+            self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.feed(self.decoder.decode(chunk, final))
+
+    def handle_starttag(self, tag, attrs, empty_element=True):
+        self.end_data()
+        capture = None
+        if tag == 'p':
+            capture = []
+            self.open_paragraphs += 1
+        elif tag == 'h1' and not self.heading_found and dict(attrs).get('id') == 'firstHeading':
+            capture = []
+            self.heading_found = True
+        self.stack.append((tag, capture))
+        self.open_counts[tag] += 1
+        if capture is not None:
+            self.captures.append(capture)
+        if tag in STRING_CONTAINERS:
+            self.containers += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_whitespace += 1
+        if empty_element and tag in EMPTY_ELEMENT_TAGS:
+            self.end_tag(tag)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, empty_element=False)
+        self.end_tag(tag)
+
+    def handle_endtag(self, tag):
+        # </br> after <br> was already handled with the start tag
+        if tag in self.already_closed:
+            self.already_closed.remove(tag)
+        else:
+            self.end_tag(tag)
+
+    def end_tag(self, tag):
+        # Close the most recent open `tag` and everything opened inside it; nothing if it isn't open
+        self.end_data()
+        while self.open_counts[tag]:
+            if self.pop() == tag:
+                break
+
+    def pop(self):
+        name, capture = self.stack.pop()
+        self.open_counts[name] -= 1
+        if name in STRING_CONTAINERS:
+            self.containers -= 1
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_whitespace -= 1
+        if capture is not None:
+            self.captures.pop()
+            text = ''.join(capture)
+            if name == 'p':
+                self.open_paragraphs -= 1
+                # A paragraph inside another one is part of the outer one, which comes first in the document
+                if self.first_paragraph is None and not self.open_paragraphs and text.strip():
+                    self.first_paragraph = text.strip()
+            else:
+                self.title = text
+        return name
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_entityref(self, name):
+        self.data.append(EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name, '&' + name))
+
+    def handle_charref(self, name):
+        # html.unescape applies the HTML5 rules (e.g. &#150; is the windows-1252 en dash, out of range is U+FFFD)
+        # but drops control characters and noncharacters, which BeautifulSoup keeps
+        match = CHARREF.match(name)
+        if match is None:
+            self.data.append(name[1:] if name[:1] in 'xX' else name)
+            return
+        number, extra = match.groups()
+        codepoint = int(number[1:], 16) if number[0] in 'xX' else int(number)
+        self.data.append((html.unescape(f'&#{codepoint};') or chr(codepoint)) + extra)
+
+    def end_data(self, is_text=None):
+        # One string ends at every tag, comment or declaration. is_text=None means text unless it is inside
+        # a script, style, template, rt or rp element.
+        if not self.data:
+            return
+        text = ''.join(self.data)
+        self.data = []
+        if not self.preserve_whitespace and all(character in ASCII_SPACES for character in text):
+            text = '\n' if '\n' in text else ' '
+        if is_text is None:
+            is_text = not self.containers
+        if is_text:
+            for capture in self.captures:
+                capture.append(text)
+
+    def handle_comment(self, data):
+        self.end_data()
+        self.data.append(data)
+        self.end_data(is_text=False)
+
+    def handle_decl(self, decl):
+        self.handle_comment(decl)
+
+    def handle_pi(self, data):
+        self.handle_comment(data)
+
+    def unknown_decl(self, data):
+        self.end_data()
+        self.data.append(data[len('CDATA['):] if data.upper().startswith('CDATA[') else data)
+        self.end_data(is_text=data.upper().startswith('CDATA['))
+
+    def close(self):
+        self.feed_bytes(b'', final=True)
+        super().close()
+        self.end_data()
+        while self.stack:
+            self.pop()
+
+    def result(self):
+        if self.title is None:
+            raise ValueError("Page has no #firstHeading title")
+        return self.title, self.first_paragraph or ""
+
+
+def extract_streaming(response):
+    # Feed the body to a PageExtractor as it arrives and stop reading once it is done.
+    # Returns (title, first paragraph, bytes read).
+    extractor = PageExtractor()
+    received = []
+    chunks = response.iter_content(CHUNK_SIZE)
+    try:
+        for chunk in chunks:
+            received.append(chunk)
+            extractor.feed_bytes(chunk)
+            if extractor.done:
+                break
+        else:
+            extractor.close()
+    except (UnicodeDecodeError, LookupError):
+        # Not in the encoding guessed from the start of the page, or an unknown one: let BeautifulSoup work it out
+        content = b''.join(received) + b''.join(chunks)
+        return extract_page(content) + (len(content),)
+    finally:
+        finish_response(response)
+    return extractor.result() + (sum(len(chunk) for chunk in received),)
+
+
+def extract_content(content, parser='stream'):
+    # extract_page or extract_streaming for a body that was already downloaded
+    if parser == 'soup':
+        return extract_page(content)
+    extractor = PageExtractor()
+    try:
+        for start in range(0, len(content), CHUNK_SIZE):
+            extractor.feed_bytes(content[start:start + CHUNK_SIZE])
+            if extractor.done:
+                break
+        else:
+            extractor.close()
+    except (UnicodeDecodeError, LookupError):
+        return extract_page(content)
+    return extractor.result()
+
+
+def parse_batch(contents, parser):
+    # Parse stage, run in a worker process: (title, first paragraph) or the exception for every page,
+    # and the seconds spent on the batch
+    started = time.perf_counter()
+    results = []
+    for content in contents:
+        try:
+            results.append(extract_content(content, parser))
+        except Exception as e:
+            results.append(e)
+    return results, time.perf_counter() - started
+
+
+def finish_response(response):
+    # Read a short rest of the body so the connection goes back to the pool, or close it
+    length = response.headers.get('Content-Length')
+    remaining = int(length) - response.raw.tell() if length and length.isdigit() else None
+    if remaining is not None and 0 < remaining <= DRAIN_BYTES:
+        for _ in response.iter_content(CHUNK_SIZE):
+            pass
+    response.close()
+
+
+def scrape_wikipedia_page(url, session=None):
+    response = (session or requests).get(url, stream=True)
+    title, first_paragraph, _ = extract_streaming(response)
+    return title, first_paragraph
+
+
+class HostLimiter:
+    def __init__(self, per_host):
+        # At most per_host requests in flight to the same host, whatever the overall concurrency
+        self.per_host = per_host
+        self.semaphores = defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+        self.lock = threading.Lock()
+
+    def __call__(self, url):
+        with self.lock:
+            return self.semaphores[urlsplit(url).netloc]
+
+
+class ScrapeStats:
+    def __init__(self):
+        self.pages = 0
+        self.failed = 0
+        self.invalid = 0
+        self.retries = 0
+        self.cached = 0
+        self.not_modified = 0
+        self.bytes = 0
+        # Fetch and parse stages when pages are parsed in other processes
+        self.fetched = 0
+        self.parsed = 0
+        self.parse_seconds = 0
+        self.held_back = 0  # Seconds the fetch stage waited for the parse stage to catch up
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def page(self, size):
+        with self.lock:
+            self.pages += 1
+            self.bytes += size
+
+    def failure(self):
+        with self.lock:
+            self.failed += 1
+
+    def retried(self):
+        with self.lock:
+            self.retries += 1
+
+    def cache_hit(self, revalidated):
+        with self.lock:
+            self.pages += 1
+            if revalidated:
+                self.not_modified += 1
+            else:
+                self.cached += 1
+
+    def fetched_page(self):
+        with self.lock:
+            self.fetched += 1
+
+    def parsed_batch(self, pages, seconds):
+        with self.lock:
+            self.parsed += pages
+            self.parse_seconds += seconds
+
+    def stage_summary(self, processes):
+        # Pages/s of each stage: the fetch stage over the whole run, the parse stage over the time its processes
+        # were busy. A parse stage close to 100% busy (and a fetch stage held back) is the bottleneck.
+        elapsed = time.perf_counter() - self.started
+        parse_rate = self.parsed / self.parse_seconds if self.parse_seconds else 0
+        return (f"fetch: {self.fetched} pages, {self.fetched / elapsed:.1f} pages/s, "
+                f"held back {self.held_back:.1f} s by the parse stage; "
+                f"parse: {self.parsed} pages, {parse_rate * processes:.1f} pages/s with {processes} processes, "
+                f"{self.parse_seconds / (elapsed * processes):.0%} busy")
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return (f"{self.pages} pages ({self.cached} from the cache, {self.not_modified} not modified), "
+                f"{self.failed} failed, {self.invalid} invalid URLs, {self.retries} retries, "
+                f"{self.bytes / 1e6:.1f} MB in {elapsed:.1f} s ({self.pages / elapsed:.1f} pages/s, "
+                f"{self.bytes / 1e6 / elapsed:.2f} MB/s)")
+
+
+def read_urls(lines, stats):
+    # Valid Wikipedia URLs from the lines of a file, skipping blank lines and # comments
+    for line in lines:
+        url = line.strip()
+        if not url or url.startswith('#'):
+            continue
+        if validate_wikipedia_url(url):
+            yield url
+        else:
+            stats.invalid += 1
+            print(f"Skipping invalid Wikipedia URL: {url}", file=sys.stderr)
+
+
+def with_origin(url, origin):
+    # Fetch the page from another server (e.g. a local copy of the pages) keeping its path
+    if not origin:
+        return url
+    scheme, netloc, _, _, _ = urlsplit(origin)
+    _, _, path, query, fragment = urlsplit(url)
+    return urlunsplit((scheme, netloc, path, query, fragment))
+
+
+def scrape_one(session, url, limiter, args, stats, cache=None, parse=True):
+    # A page still fresh in the cache costs no request, and an older one a conditional GET that is
+    # answered with 304 Not Modified (and nothing to parse) if the page hasn't changed.
+    # With parse=False a downloaded page is left for the parse stage: returns (None, response) with the whole
+    # body read, and finish_page() does the rest once it is parsed.
+    entry = cache.get(url) if cache else None
+    if entry and entry['fresh']:
+        stats.cache_hit(revalidated=False)
+        return entry['title'], entry['first_paragraph']
+    headers = cache.conditional_headers(entry) if entry else None
+
+    fetch_url = with_origin(url, args.origin)
+    with limiter(fetch_url):
+        response = fetch_page(session, fetch_url, args.retries, args.backoff, args.timeout, stats,
+                              stream=parse and args.parser == 'stream', headers=headers)
+        if response.status_code == 304 and entry:
+            response.close()
+            cache.revalidated(url, response)
+            stats.cache_hit(revalidated=True)
+            return entry['title'], entry['first_paragraph']
+        if not parse:
+            stats.fetched_page()
+            return None, response
+        if args.parser == 'soup':
+            title, first_paragraph = extract_page(response.content)
+            size = len(response.content)
+        else:
+            title, first_paragraph, size = extract_streaming(response)
+    finish_page(url, response, title, first_paragraph, size, stats, cache)
+    return title, first_paragraph
+
+
+def finish_page(url, response, title, first_paragraph, size, stats, cache=None):
+    if cache:
+        cache.put(url, response, title, first_paragraph)
+    stats.page(size)
+
+
+def scrape_batch(urls, args, stats, cache=None):
+    # Scrape every URL with up to args.concurrency requests at once over one keep-alive session.
+    # Yields (url, title, first paragraph) in completion order. URLs are submitted as threads free up,
+    # so a list of millions of URLs is never queued all at once.
+    session = create_session(args.concurrency)
+    limiter = HostLimiter(args.per_host)
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='fetch') as pool:
+        running = {}
+        urls = iter(urls)
+        while True:
+            for url in urls:
+                running[pool.submit(scrape_one, session, url, limiter, args, stats, cache)] = url
+                if len(running) >= args.concurrency * 2:
+                    break
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = running.pop(future)
+                try:
+                    title, first_paragraph = future.result()
+                except Exception as e:
+                    # Whatever went wrong with one page, count it and go on with the rest of the crawl
+                    stats.failure()
+                    print(f"Failed to scrape {url}: {e}", file=sys.stderr)
+                    continue
+                yield url, title, first_paragraph
+
+
+def scrape_pipeline(urls, args, stats, cache=None):
+    # scrape_batch with the parsing moved to args.processes processes, for when it is the bottleneck: the fetch
+    # threads download whole pages, which are sent to the processes in batches (PARSE_BATCH_PAGES/_BYTES).
+    # At most two batches per process are waiting or being parsed; beyond that no new page is fetched until
+    # one is done, so downloaded pages never pile up. Yields (url, title, first paragraph) in completion order.
+    session = create_session(args.concurrency)
+    limiter = HostLimiter(args.per_host)
+    max_batches = args.processes * 2
+    # Parse processes are started fresh ('spawn'): forking while the fetch threads are running isn't safe
+    parse_pool = ProcessPoolExecutor(args.processes, mp_context=multiprocessing.get_context('spawn'))
+    with parse_pool, ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='fetch') as fetch_pool:
+        fetching = {}
+        parsing = {}
+        pending = []  # Downloaded pages for the next batch as (url, response)
+        pending_bytes = 0
+        urls = iter(urls)
+        while True:
+            if len(parsing) < max_batches:
+                for url in urls:
+                    fetching[fetch_pool.submit(scrape_one, session, url, limiter, args, stats, cache, False)] = url
+                    if len(fetching) >= args.concurrency * 2:
+                        break
+            full = len(pending) >= PARSE_BATCH_PAGES or pending_bytes >= PARSE_BATCH_BYTES
+            if pending and (full or not fetching) and len(parsing) < max_batches:
+                batch = parse_pool.submit(parse_batch, [response.content for _, response in pending], args.parser)
+                parsing[batch] = pending
+                pending = []
+                pending_bytes = 0
+            if not fetching and not parsing:
+                break
+
+            held_back = len(parsing) >= max_batches
+            started = time.perf_counter()
+            done, _ = wait(list(fetching) + list(parsing), return_when=FIRST_COMPLETED)
+            if held_back:
+                stats.held_back += time.perf_counter() - started
+            for future in done:
+                if future in parsing:
+                    pages = parsing.pop(future)
+                    try:
+                        results, seconds = future.result()
+                        stats.parsed_batch(len(pages), seconds)
+                    except Exception as e:
+                        # The batch didn't come back (e.g. a parse process died): all of its pages failed
+                        results = [e] * len(pages)
+                    for (url, response), result in zip(pages, results):
+                        try:
+                            if isinstance(result, Exception):
+                                raise result
+                            title, first_paragraph = result
+                            finish_page(url, response, title, first_paragraph, len(response.content), stats, cache)
+                        except Exception as e:
+                            stats.failure()
+                            print(f"Failed to scrape {url}: {e}", file=sys.stderr)
+                            continue
+                        yield url, title, first_paragraph
+                    continue
+                url = fetching.pop(future)
+                try:
+                    title, result = future.result()
+                except Exception as e:
+                    stats.failure()
+                    print(f"Failed to scrape {url}: {e}", file=sys.stderr)
+                    continue
+                if title is None:
+                    pending.append((url, result))
+                    pending_bytes += len(result.content)
+                else:
+                    yield url, title, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scrape the title and first paragraph of Wikipedia pages.')
+    parser.add_argument('--batch', metavar='file', default=None,
+                        help="scrape every URL in this file (one per line, '-' for stdin) instead of asking for one")
+    parser.add_argument('--concurrency', type=int, default=8, help='pages fetched at once')
+    parser.add_argument('--per-host', type=int, default=4, help='pages fetched at once from the same host')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--backoff', type=float, default=0.5, help='seconds before the first retry, doubling after')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--parser', choices=['stream', 'soup'], default='stream',
+                        help='stream: stop downloading once the title and first paragraph are found; '
+                             'soup: download the whole page and parse it with BeautifulSoup')
+    parser.add_argument('--processes', metavar='N', type=int, nargs='?', const=os.cpu_count(), default=0,
+                        help='parse the pages of a batch in this many processes (one per core if no number is '
+                             'given) instead of in the fetch threads; pages are then downloaded whole')
+    parser.add_argument('--origin', metavar='url', default=None,
+                        help='fetch the pages from this server instead, e.g. a local stand-in serving fixture pages '
+                             '(http://127.0.0.1:8000 for `python -m http.server` in a directory with wiki/<Title>)')
+    parser.add_argument('--cache', metavar='file', default='scrape_cache.db',
+                        help='remember what was extracted from every page, to skip unchanged pages next time')
+    parser.add_argument('--no-cache', dest='cache', action='store_const', const=None)
+    parser.add_argument('--cache-max-age', metavar='seconds', type=float, default=24 * 3600,
+                        help='use a cached page without asking the server for this long, then revalidate it')
+    parser.add_argument('--cache-size', metavar='MB', type=float, default=100)
+    parser.add_argument('--store', metavar='file', default='scraped_pages.db',
+                        help='keep every scraped page here, one row per URL, across runs')
+    parser.add_argument('--csv', metavar='file', default='Wikipedia_Content.csv',
+                        help='export every stored page to this CSV file at the end')
+    parser.add_argument('--no-csv', dest='csv', action='store_const', const=None,
+                        help="don't export (e.g. during a long crawl; export once it's done)")
+    args = parser.parse_args()
+
+    stats = ScrapeStats()
+    cache = ScrapeCache(args.cache, int(args.cache_size * 1024 * 1024), args.cache_max_age) if args.cache else None
+    store = PageStore(args.store)
+    try:
+        if args.batch is None:
+            url = get_wikipedia_url()
+            title, first_paragraph = scrape_one(create_session(1), url, HostLimiter(1), args, stats, cache)
+
+            print(f"Title: {title}")
+            print(f"Description: {first_paragraph}")
+
+            store.add(url, title, first_paragraph)
+        else:
+            # Pages go to the store as they finish, so a long crawl holds none of them in memory
+            file = sys.stdin if args.batch == '-' else open(args.batch, encoding='utf-8')
+            with file:
+                scrape = scrape_pipeline if args.processes > 0 else scrape_batch
+                for url, title, first_paragraph in scrape(read_urls(file, stats), args, stats, cache):
+                    store.add(url, title, first_paragraph)
+            print(f"Scraped {stats.summary()}")
+            if args.processes > 0:
+                print(f"Stages: {stats.stage_summary(args.processes)}")
+
+        if args.csv:
+            store.export_csv(args.csv)
+    finally:
+        store.close()
+        if cache:
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
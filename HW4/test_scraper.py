@@ -0,0 +1,69 @@
+# test_scraper.py
+# PageExtractor (extract_content) has to find the same title and first paragraph as the BeautifulSoup version
+# (extract_page). Run with `python -m pytest HW4`.
+import pytest
+import scraper
+
+HEADING = '<h1 id="firstHeading" class="firstHeading"><span class="mw-page-title-main">Test page</span></h1>'
+
+
+def page(body, head='', heading=HEADING):
+    return f'<!DOCTYPE html><html><head>{head}<title>Test</title></head><body>{heading}{body}</body></html>'
+
+
+FIXTURES = {
+    'plain': page('<p>First paragraph.</p><p>Second one.</p>'),
+    'empty paragraphs first': page('<p class="mw-empty-elt">\n</p><p>  \n\t</p><p><b>Bold</b> start, <a href="/wiki/X">link</a>.</p>'),
+    'named entities': page('<p>A &amp; B &lt;c&gt; &nbsp;d&copy; &eacute;t&eacute; &notanentity; AT&T &amp</p>'),
+    'numeric references': page('<p>&#65;&#x42;&#X43; &#150; &#128; &#1; &#0; &#x110000; &#99999999999; &#xD800; '
+                               '&#65abc; &#x41zz;</p>'),
+    'whitespace strings': page('<p> <b>a</b>   <i>b</i>\n\n<span> </span>c </p>'),
+    'preformatted': page('<p><pre>  keep \n  this  </pre> <textarea>  and\nthis </textarea></p>'),
+    'nested paragraphs': page('<div><p>Outer <span><p>inner</p></span> tail</p></div><p>Later</p>'),
+    'unclosed paragraphs': page('<p>One<p>Two<div>three</div>'),
+    'stray end tags': page('</p></b><p>Text</i> after</p>'),
+    'scripts and styles': page('<p><script>var x = "<p>no</p>";</script><style>p { }</style>Visible'
+                               '<template>hidden</template><ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby></p>'),
+    'comments and declarations': page('<p><!-- comment -->Text<![CDATA[ cdata ]]><?pi stuff?> end</p>'),
+    'empty elements': page('<p>Line<br>break<br/>and<br></br>more<img src="x.png">text<hr></p>'),
+    'heading with markup': page('<p>Body</p>', heading='<h1 id="firstHeading"> <i>Italic</i> &amp; <b>bold</b>\n</h1>'),
+    'second heading ignored': page('<h1 id="firstHeading">Again</h1><p>Text</p>'),
+    'table before text': page('<table><tr><td><p>In a table</p></td></tr></table><p>After</p>'),
+    'no paragraph': page('<div>No paragraphs here</div>'),
+    'long page': page('<p>' + 'Lorem ipsum dolor sit amet. ' * 2000 + '</p><p>Second</p>'),
+    'late first paragraph': page('<div>' + '<span>filler</span>' * 3000 + '</div><p>Finally, text.</p>'),
+}
+
+ENCODED_FIXTURES = {
+    'utf-8 without declaration': page('<p>Ünïcödé — 漢字 ' * 500 + '</p>').encode('utf-8'),
+    'utf-8 with BOM': b'\xef\xbb\xbf' + page('<p>Ünïcödé — 漢字</p>').encode('utf-8'),
+    'latin-1 meta charset': page('<p>Caf\xe9 cr\xe8me</p>', '<meta charset="iso-8859-1">').encode('latin-1'),
+    'windows-1252 http-equiv': page('<p>“quoted” – dash</p>',
+                                    '<meta http-equiv="Content-Type" content="text/html; charset=windows-1252">'
+                                    ).encode('windows-1252'),
+    'utf-16 with BOM': page('<p>Wide text ✓</p>').encode('utf-16'),
+    'unknown charset': page('<p>Bogus charset</p>', '<meta charset="x-bogus">').encode('utf-8'),
+    'wrong charset': page('<p>Not ascii: ✓</p>', '<meta charset="ascii">').encode('utf-8'),
+}
+
+
+ALL_FIXTURES = ([pytest.param(html.encode('utf-8'), id=name) for name, html in FIXTURES.items()] +
+                [pytest.param(content, id=name) for name, content in ENCODED_FIXTURES.items()])
+
+
+@pytest.mark.parametrize('content', ALL_FIXTURES)
+def test_extract_content_matches_extract_page(content):
+    assert scraper.extract_content(content) == scraper.extract_page(content)
+
+
+@pytest.mark.parametrize('content', ALL_FIXTURES)
+def test_small_chunks(content, monkeypatch):
+    # Tags, references and multi-byte characters split across chunks
+    monkeypatch.setattr(scraper, 'CHUNK_SIZE', 7)
+    assert scraper.extract_content(content) == scraper.extract_page(content)
+
+
+def test_missing_title():
+    content = page('<p>Text</p>', heading='<h1>Not the title</h1>').encode('utf-8')
+    with pytest.raises(ValueError):
+        scraper.extract_content(content)
@@ -0,0 +1,329 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from framing import CODECS, JSON_CODEC, read_message, write_message
+from strategies import BinarySearch
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Multiplayer: seconds a client out of attempts waits for the round to end before guessing again
+IDLE_GUESS_AFTER = 1.0
+# How each server is started when the benchmark spawns it itself. Both run in HW3, where the certificate
+# and key they load from the working directory are.
+SERVER_COMMANDS = {
+    'hw2': ([sys.executable, os.path.join(ROOT_DIR, 'server.py'), '--async'], os.path.join(ROOT_DIR, 'HW3')),
+    'hw3': ([sys.executable, 'server.py'], os.path.join(ROOT_DIR, 'HW3')),
+}
+
+
+class Stats:
+    def __init__(self):
+        # Counters and latency samples collected by every simulated client
+        self.connections = 0
+        self.games = 0
+        self.wins = 0
+        self.losses = 0
+        self.errors = 0
+        self.handshake_latencies = []
+        self.message_latencies = []
+
+
+# Function to send one message and time how long the reply takes
+async def request(reader, writer, message, codec, stats):
+    started = time.perf_counter()
+    write_message(writer, message, codec)
+    await writer.drain()
+    reply = await read_message(reader)
+    stats.message_latencies.append(time.perf_counter() - started)
+    if reply is None:
+        raise ConnectionError("Server closed the connection.")
+    return reply
+
+
+# Function to open a TLS connection and time the TCP connect plus handshake
+async def connect(host, port, context, stats):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port, ssl=context, server_hostname=host)
+    stats.handshake_latencies.append(time.perf_counter() - started)
+    stats.connections += 1
+    return reader, writer
+
+
+# Function to count how a game ended
+def record_outcome(message, stats):
+    stats.games += 1
+    if message.startswith("Congratulations"):
+        stats.wins += 1
+    else:
+        stats.losses += 1
+
+
+# Function to play one guessing game over the current connection until it is won or lost
+async def play_single_game(reader, writer, codec, stats):
+    strategy = BinarySearch()
+    while True:
+        reply = await request(reader, writer, {"guess": strategy.next_guess()}, codec, stats)
+        text = reply['message']
+        if text.startswith("Congratulations") or "Sorry" in text:
+            record_outcome(text, stats)
+            return
+        strategy.feedback(text)
+
+
+# Function for one simulated client of server.py: one connection per game
+async def hw2_client(host, port, context, codec, games, stats):
+    for _ in range(games):
+        reader, writer = await connect(host, port, context, stats)
+        try:
+            start_message = {"message": "start."}
+            if codec != JSON_CODEC:
+                start_message["codec"] = codec
+            await request(reader, writer, start_message, JSON_CODEC, stats)
+            await play_single_game(reader, writer, codec, stats)
+        finally:
+            writer.close()
+
+
+# Function for one simulated client of HW3 GameServer in single player mode: many games per connection
+async def hw3_single_client(host, port, context, codec, games, stats):
+    reader, writer = await connect(host, port, context, stats)
+    try:
+        await read_message(reader)  # Mode prompt
+        send_codec = JSON_CODEC
+        for _ in range(games):
+            mode_message = {"mode": "1"}
+            if codec != JSON_CODEC and send_codec == JSON_CODEC:
+                mode_message["codec"] = codec
+            await request(reader, writer, mode_message, send_codec, stats)
+            send_codec = codec
+            await play_single_game(reader, writer, send_codec, stats)
+            await read_message(reader)  # Mode prompt after the game
+        write_message(writer, {"mode": "exit"}, send_codec)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+# Function for one simulated client of HW3 GameServer in multi player mode.
+# Other players' wins reset the round, so replies are read as a stream instead of strictly request/response.
+async def hw3_multi_client(host, port, context, codec, rounds, stats, reply_timeout, room=None):
+    reader, writer = await connect(host, port, context, stats)
+    read = None
+    try:
+        await read_message(reader)  # Mode prompt
+        mode_message = {"mode": "2"}
+        if room:
+            mode_message["room"] = room
+        if codec != JSON_CODEC:
+            mode_message["codec"] = codec
+        await request(reader, writer, mode_message, JSON_CODEC, stats)
+        strategy = BinarySearch()
+        out_of_attempts = False
+        while rounds > 0:
+            if not out_of_attempts:
+                started = time.perf_counter()
+                write_message(writer, {"guess": strategy.next_guess()}, codec)
+                await writer.drain()
+            # The read isn't cancelled when the wait runs out, so no frame is ever cut in half
+            if read is None:
+                read = asyncio.ensure_future(read_message(reader))
+            done, _ = await asyncio.wait({read}, timeout=IDLE_GUESS_AFTER if out_of_attempts else reply_timeout)
+            if not done:
+                if not out_of_attempts:
+                    raise asyncio.TimeoutError()
+                # Nothing happened since this client ran out of attempts: the players who still had attempts may
+                # have finished and left. Once nobody has attempts left the server starts a new round on the next
+                # guess, and otherwise just answers "Sorry" again.
+                started = None
+                write_message(writer, {"guess": strategy.next_guess()}, codec)
+                await writer.drain()
+                continue
+            reply = read.result()
+            read = None
+            if reply is None:
+                raise ConnectionError("Server closed the connection.")
+            if not out_of_attempts and started is not None:
+                stats.message_latencies.append(time.perf_counter() - started)
+            text = reply['message']
+            if "Starting a new game" in text:
+                # Someone won or everyone ran out of attempts: a new round with a new number
+                record_outcome(text if text.startswith("Congratulations, you did it") else "Sorry", stats)
+                rounds -= 1
+                strategy.reset()
+                out_of_attempts = False
+            elif "Sorry" in text:
+                out_of_attempts = True
+            else:
+                # A hint means this client has attempts after all: the "Sorry" was the late reply to a guess of
+                # the previous round, sent after the announcement that ended it
+                out_of_attempts = False
+                strategy.feedback(text)
+        write_message(writer, {"exit": "exit"}, codec)
+        await writer.drain()
+    finally:
+        if read is not None:
+            read.cancel()
+        writer.close()
+
+
+# Function to read the CPU seconds (user + system) a process has used so far, or None if it can't be read
+def process_cpu_seconds(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+# Function to get the p-th percentile (nearest rank) of the samples, in milliseconds
+def percentile(samples, p):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return round(ordered[index] * 1000, 3)
+
+
+# Function to summarize a latency list as the percentiles the report needs
+def latency_summary(samples):
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50),
+        'p99_ms': percentile(samples, 99),
+        'p999_ms': percentile(samples, 99.9),
+        'max_ms': round(max(samples) * 1000, 3) if samples else None,
+    }
+
+
+# Function to run one simulated client and count its failure instead of stopping the benchmark
+async def run_client(client, stats):
+    try:
+        await client
+    except (ConnectionError, OSError, ssl.SSLError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+        stats.errors += 1
+        logging.error(f"Simulated client failed: {e}")
+
+
+# Function to run the whole benchmark and return the report as a dictionary
+async def run_benchmark(args):
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=args.cafile)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_REQUIRED if args.cafile else ssl.CERT_NONE
+
+    stats = Stats()
+    clients = []
+    for number in range(args.clients):
+        if args.target == 'hw2':
+            client = hw2_client(args.host, args.port, context, args.codec, args.games, stats)
+        elif args.mode == 'multi':
+            room = f"bench-{number % args.rooms}" if args.rooms else None
+            client = hw3_multi_client(args.host, args.port, context, args.codec, args.games, stats,
+                                      args.reply_timeout, room)
+        else:
+            client = hw3_single_client(args.host, args.port, context, args.codec, args.games, stats)
+        clients.append(run_client(client, stats))
+
+    cpu_before = process_cpu_seconds(args.server_pid) if args.server_pid else None
+    started = time.perf_counter()
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - started
+    cpu_after = process_cpu_seconds(args.server_pid) if args.server_pid else None
+
+    server_cpu = None
+    if cpu_before is not None and cpu_after is not None:
+        server_cpu = {
+            'seconds': round(cpu_after - cpu_before, 3),
+            'percent_of_one_core': round((cpu_after - cpu_before) / elapsed * 100, 1),
+        }
+    return {
+        'config': {
+            'target': args.target,
+            'mode': args.mode,
+            'codec': args.codec,
+            'clients': args.clients,
+            'rooms': args.rooms,
+            'games_per_client': args.games,
+        },
+        'elapsed_s': round(elapsed, 3),
+        'connections': stats.connections,
+        'connections_per_s': round(stats.connections / elapsed, 1),
+        'games': stats.games,
+        'games_per_s': round(stats.games / elapsed, 1),
+        'wins': stats.wins,
+        'losses': stats.losses,
+        'errors': stats.errors,
+        'handshake_latency': latency_summary(stats.handshake_latencies),
+        'message_latency': latency_summary(stats.message_latencies),
+        'server_cpu': server_cpu,
+    }
+
+
+# Function to start the server under test and wait until it accepts connections
+def spawn_server(target, host, port):
+    command, cwd = SERVER_COMMANDS[target]
+    # The server's log goes to a file rather than a pipe nobody reads, and is shown if it doesn't start
+    log = tempfile.TemporaryFile()
+    server = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    server.wait()
+    log.seek(0)
+    output = log.read().decode(errors='replace').strip()
+    log.close()
+    raise RuntimeError(f"Server did not start listening on {host}:{port}." + (f" Its output:\n{output}" if output else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load-test the number guessing game TLS servers.')
+    parser.add_argument('--target', choices=['hw2', 'hw3'], default='hw3',
+                        help='hw2 = server.py, hw3 = HW3/server.py GameServer')
+    parser.add_argument('--mode', choices=['single', 'multi'], default='single', help='HW3 game mode')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=65432)
+    parser.add_argument('--clients', type=int, default=50, help='number of concurrent simulated clients')
+    parser.add_argument('--games', type=int, default=20, help='games (or multiplayer rounds) per client')
+    parser.add_argument('--codec', choices=CODECS, default=JSON_CODEC)
+    parser.add_argument('-a', dest='cafile', metavar='cafile', default=os.path.join(ROOT_DIR, 'HW3', 'cert.crt'),
+                        help='CA certificate to verify the server with')
+    parser.add_argument('--spawn', action='store_true', help='start the target server and stop it afterwards')
+    parser.add_argument('--server-pid', type=int, default=None, help='measure CPU of an already running server')
+    parser.add_argument('--rooms', type=int, default=0,
+                        help='multiplayer: spread clients over this many named rooms (0 = server matchmaking)')
+    parser.add_argument('--reply-timeout', type=float, default=10, help='multiplayer wait for a reply (seconds)')
+    parser.add_argument('--output', metavar='file', default=None, help='also write the JSON report here')
+    args = parser.parse_args()
+
+    server_process = None
+    if args.spawn:
+        server_process = spawn_server(args.target, args.host, args.port)
+        args.server_pid = server_process.pid
+    try:
+        report = asyncio.run(run_benchmark(args))
+    finally:
+        if server_process:
+            server_process.terminate()
+            server_process.wait()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import ssl
+import time
+from bench import latency_summary
+from framing import CODECS, JSON_CODEC, read_message, write_message
+from game_history import iter_history
+from strategies import STRATEGIES, make_strategy, recorded_guesses
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class BotStats:
+    def __init__(self):
+        # Results of every game played by the bots of this process
+        self.game_latencies = []
+        self.guesses_to_win = collections.Counter()
+        self.wins = 0
+        self.losses = 0
+        self.errors = 0
+
+    def record(self, seconds, guesses, won):
+        self.game_latencies.append(seconds)
+        if won:
+            self.wins += 1
+            self.guesses_to_win[guesses] += 1
+        else:
+            self.losses += 1
+
+
+# Function to play one game over an open connection with the given strategy, until it is won or lost.
+# The game's latency is measured from the first guess to the final answer.
+async def play_game(reader, writer, codec, strategy, stats):
+    strategy.reset()
+    guesses = 0
+    started = time.perf_counter()
+    while True:
+        write_message(writer, {"guess": strategy.next_guess()}, codec)
+        await writer.drain()
+        reply = await read_message(reader)
+        if reply is None:
+            raise ConnectionError("Server closed the connection.")
+        guesses += 1
+        text = reply['message']
+        if text.startswith("Congratulations") or "Sorry" in text:
+            stats.record(time.perf_counter() - started, guesses, text.startswith("Congratulations"))
+            return
+        strategy.feedback(text)
+
+
+# Function to read one reply, treating a closed connection as an error
+async def expect_reply(reader):
+    reply = await read_message(reader)
+    if reply is None:
+        raise ConnectionError("Server closed the connection.")
+    return reply
+
+
+# Function for one bot playing server.py: the server plays one game per connection
+async def hw2_bot(host, port, context, codec, strategy, keep_playing, stats):
+    while keep_playing():
+        reader, writer = await asyncio.open_connection(host, port, ssl=context, server_hostname=host)
+        try:
+            start_message = {"message": "start."}
+            if codec != JSON_CODEC:
+                start_message["codec"] = codec
+            write_message(writer, start_message)
+            await expect_reply(reader)
+            await play_game(reader, writer, codec, strategy, stats)
+        finally:
+            writer.close()
+
+
+# Function for one bot playing HW3 GameServer in single player mode, all of its games over one connection
+async def hw3_bot(host, port, context, codec, strategy, keep_playing, stats):
+    reader, writer = await asyncio.open_connection(host, port, ssl=context, server_hostname=host)
+    try:
+        await expect_reply(reader)  # Mode prompt
+        send_codec = JSON_CODEC
+        while keep_playing():
+            mode_message = {"mode": "1"}
+            if codec != JSON_CODEC and send_codec == JSON_CODEC:
+                mode_message["codec"] = codec
+            write_message(writer, mode_message, send_codec)
+            await expect_reply(reader)  # Rules of the game
+            send_codec = codec
+            await play_game(reader, writer, send_codec, strategy, stats)
+            await expect_reply(reader)  # Mode prompt after the game
+        write_message(writer, {"mode": "exit"}, send_codec)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+# Function to run one bot and count its failure instead of stopping the others
+async def run_bot(bot, stats):
+    try:
+        await bot
+    except (ConnectionError, OSError, ssl.SSLError, asyncio.IncompleteReadError, ValueError) as e:
+        stats.errors += 1
+        logging.error(f"Bot failed: {e}")
+
+
+# Function to load recorded games for the replay strategy from a history log (the last `limit` games)
+def load_replay_games(filename, limit=100):
+    games = [recorded_guesses(session['messages']) for session in iter_history(filename, None, last=limit)]
+    return [guesses for guesses in games if guesses]
+
+
+# Function to build a stop condition: a number of games per bot, or everything until the duration is over
+def make_keep_playing(games, deadline):
+    if deadline is not None:
+        return lambda: time.monotonic() < deadline
+    remaining = [games]
+
+    def keep_playing():
+        remaining[0] -= 1
+        return remaining[0] >= 0
+    return keep_playing
+
+
+# Function to run every bot concurrently in this process and return the report as a dictionary
+async def run_bots(args, replay_games=None):
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=args.cafile)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_REQUIRED if args.cafile else ssl.CERT_NONE
+
+    deadline = time.monotonic() + args.duration if args.duration else None
+    play = hw2_bot if args.target == 'hw2' else hw3_bot
+    stats = BotStats()
+    bots = []
+    for number in range(args.players):
+        seed = None if args.seed is None else args.seed + number
+        strategy = make_strategy(args.strategy, replay_games, seed)
+        bot = play(args.host, args.port, context, args.codec, strategy, make_keep_playing(args.games, deadline), stats)
+        bots.append(run_bot(bot, stats))
+
+    started = time.perf_counter()
+    await asyncio.gather(*bots)
+    elapsed = time.perf_counter() - started
+
+    games = stats.wins + stats.losses
+    won_in = sum(guesses * count for guesses, count in stats.guesses_to_win.items())
+    return {
+        'config': {
+            'target': args.target,
+            'strategy': args.strategy,
+            'codec': args.codec,
+            'players': args.players,
+            'games_per_player': None if args.duration else args.games,
+            'duration_s': args.duration,
+        },
+        'elapsed_s': round(elapsed, 3),
+        'games': games,
+        'games_per_s': round(games / elapsed, 1),
+        'wins': stats.wins,
+        'losses': stats.losses,
+        'errors': stats.errors,
+        'game_latency': latency_summary(stats.game_latencies),
+        'guesses_to_win': {
+            'mean': round(won_in / stats.wins, 2) if stats.wins else None,
+            'histogram': dict(sorted(stats.guesses_to_win.items())),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Play the number guessing game with many headless bots.')
+    parser.add_argument('--target', choices=['hw2', 'hw3'], default='hw3',
+                        help='hw2 = server.py, hw3 = HW3/server.py GameServer (single player)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=65432)
+    parser.add_argument('--players', type=int, default=10, help='number of concurrent bots')
+    parser.add_argument('--games', type=int, default=10, help='games per bot')
+    parser.add_argument('--duration', type=float, default=None, help='soak test: keep playing for this many seconds')
+    parser.add_argument('--strategy', choices=STRATEGIES, default='binary')
+    parser.add_argument('--replay-log', metavar='file', default='client_history.log',
+                        help='history log whose games the replay strategy plays again')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the random strategy')
+    parser.add_argument('--codec', choices=CODECS, default=JSON_CODEC)
+    parser.add_argument('-a', dest='cafile', metavar='cafile', default=os.path.join(ROOT_DIR, 'HW3', 'cert.crt'),
+                        help='CA certificate to verify the server with')
+    parser.add_argument('--output', metavar='file', default=None, help='also write the JSON report here')
+    args = parser.parse_args()
+
+    # A missing or empty replay log is reported before any bot connects
+    replay_games = None
+    if args.strategy == 'replay':
+        try:
+            replay_games = load_replay_games(args.replay_log)
+        except FileNotFoundError:
+            parser.error(f"no history log {args.replay_log} to replay; play some games first or pass --replay-log")
+        except ValueError as e:
+            parser.error(str(e))
+        if not replay_games:
+            parser.error(f"{args.replay_log} has no recorded games to replay")
+
+    report = asyncio.run(run_bots(args, replay_games))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
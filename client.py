@@ -1,126 +1,141 @@
-import argparse
-import socket
-import ssl
-import json
-import pickle
-import zlib
-import logging
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-
-# Function to show history of previous games
-def load_and_display_history(filename='client_history.pkl'):
-    try:
-        with open(filename, 'rb') as f:
-            data = zlib.decompress(f.read())
-            history = pickle.loads(data)
-            logging.info("Loaded game history:")
-            for session in history:
-                for item in session:
-                    print(item)
-    except FileNotFoundError:
-        logging.info("No previous game history found.")
-    except (zlib.error, EOFError, pickle.UnpicklingError) as e:
-        logging.error(f"Error while loading or decompressing game history: {e}")
-
-
-# Function to compress and save game history using pickle and zlib.
-def compress_and_save_history(history, filename='client_history.pkl'):
-    try:
-        existing_history = []
-        try:
-            with open(filename, 'rb+') as f:
-                data = f.read()
-                if data:
-                    existing_history = pickle.loads(zlib.decompress(data))
-        except FileNotFoundError:
-            logging.info("No existing history. Creating new history file.")
-        except (EOFError, pickle.UnpicklingError) as e:
-            logging.warning(f"Failed to load existing history: {e}")
-
-        # Extend(append) new history to existing_history
-        existing_history.extend(history)
-
-        # Write the new data to the client pickle file
-        with open(filename, 'wb') as f:
-            compressed_data = zlib.compress(pickle.dumps(existing_history))
-            f.write(compressed_data)
-        logging.info("Game history saved successfully.")
-    except Exception as e:
-        logging.error(f"Failed to save history: {e}")
-
-
-# Function for playing game in client
-def guess_the_number_client(server_host='127.0.0.1', server_port=65432, cafile=None):
-    # Load and display the history of all the msgs exchanged during previous games.
-    load_and_display_history()
-
-    # Create default context of client
-    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=cafile)
-    context.check_hostname = False
-    # Certificate required
-    context.verify_mode = ssl.CERT_REQUIRED
-
-    # Create socket as IPv4, TCP
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        try:
-            sock.settimeout(10)
-            # Wrap socket in SSL context to create client socket
-            with context.wrap_socket(sock, server_hostname=server_host) as client_socket:
-                # Connect client to server
-                client_socket.connect((server_host, server_port))
-                logging.info("SSL connection established. The game has started.")
-                game_history = []
-
-                # Send 'start' message serialized with json
-                start_message = json.dumps({"message": "start."})
-                client_socket.sendall(start_message.encode('utf-8'))
-                game_history.append("Client: start.")
-
-                # While connected, send guesses to server
-                while True:
-                    response = client_socket.recv(1024).decode('utf-8')
-                    if not response:
-                        raise ConnectionError("Unexpected disconnection from server.")
-
-                    # Append game history and print server's message
-                    game_history.append(f"Server: {response}")
-                    response_json = json.loads(response)
-                    print("Server:", response_json['message'])
-
-                    # End session if game ends
-                    if "Congratulations" in response_json['message'] or "Sorry" in response_json['message']:
-                        break
-
-                    # Input guess and append to game history
-                    guess = input("Your guess: ")
-                    guess_json = json.dumps({"guess": guess})
-                    client_socket.sendall(guess_json.encode('utf-8'))
-                    game_history.append(f"Client: {guess}")
-
-                # Game ended -> Compress (pickle and zlib)
-                compress_and_save_history([game_history])
-                logging.info("Game session ended and history saved.")
-        # Various error handling
-        except socket.gaierror:
-            logging.error("GAI error.")
-        except ssl.SSLCertVerificationError as e:
-            logging.error(f"SSL Certificate Verification Failed: {e}")
-        except socket.timeout:
-            logging.error("Connection timed out.")
-        except ConnectionError as e:
-            logging.error(f"Unexpected disconnection. Closing game. {e}")
-        except ssl.SSLError as e:
-            logging.error(f"SSL error occurred: {e}")
-        except socket.error as e:
-            logging.error(f"Socket error occurred: {e}")
-
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Connect to the number guessing game server.')
-    # Using -a option to specify CA certificate file to trust that cert file
-    parser.add_argument('-a', metavar='cafile', default=None)
-    args = parser.parse_args()
-    guess_the_number_client('127.0.0.1', 65432, args.a)
+import argparse
+import functools
+import socket
+import ssl
+import logging
+from framing import BINARY_CODEC, JSON_CODEC, MessageStream
+from tls_sessions import SessionCache
+from game_history import compress_and_save_history, iter_history, load_and_display_history, make_session
+from strategies import STRATEGIES, make_strategy, recorded_guesses
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# TLS sessions of this process, so playing again resumes the session instead of doing a full handshake
+SESSION_CACHE = SessionCache()
+
+
+# Function to create the client SSL context once per CA file (sessions can only be resumed with the same context)
+@functools.lru_cache(maxsize=None)
+def create_client_context(cafile=None):
+    # Create default context of client
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=cafile)
+    context.check_hostname = False
+    # Certificate required
+    context.verify_mode = ssl.CERT_REQUIRED
+    return context
+
+
+# Function for playing game in client. With a strategy (see strategies.py) the guesses come from it instead of
+# the keyboard, so the game can be played headless. Returns 'win' or 'loss', or None if the game failed.
+def guess_the_number_client(server_host='127.0.0.1', server_port=65432, cafile=None, history_limit=0,
+                            codec=JSON_CODEC, session_cache=SESSION_CACHE, strategy=None):
+    # Show the last few games only, so startup time doesn't grow with the history.
+    load_and_display_history('client_history.log', 'client_history.pkl', limit=history_limit)
+
+    context = create_client_context(cafile)
+    session = session_cache.get(server_host, server_port, context)
+
+    # Create socket as IPv4, TCP
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.settimeout(10)
+            # Wrap socket in SSL context to create client socket
+            with context.wrap_socket(sock, server_hostname=server_host, session=session) as client_socket:
+                # Connect client to server
+                client_socket.connect((server_host, server_port))
+                resumed = " (resumed TLS session)" if client_socket.session_reused else ""
+                logging.info(f"SSL connection established{resumed}. The game has started.")
+                game_history = []
+                stream = MessageStream(client_socket)
+                if strategy is not None:
+                    strategy.reset()
+
+                # Send 'start' message serialized with json, asking for the binary codec if wanted
+                start_message = {"message": "start."}
+                if codec != JSON_CODEC:
+                    start_message["codec"] = codec
+                stream.send(start_message)
+                game_history.append("Client: start.")
+
+                # While connected, send guesses to server
+                while True:
+                    response_json = stream.recv()
+                    if response_json is None:
+                        raise ConnectionError("Unexpected disconnection from server.")
+
+                    # Append game history and print server's message
+                    game_history.append(f"Server: {response_json}")
+                    print("Server:", response_json['message'])
+                    # Switch to the binary codec once the server has answered with it
+                    if codec == BINARY_CODEC and stream.peer_codec == BINARY_CODEC:
+                        stream.codec = BINARY_CODEC
+
+                    # End session if game ends
+                    if "Congratulations" in response_json['message'] or "Sorry" in response_json['message']:
+                        break
+
+                    # Input guess and append to game history
+                    if strategy is None:
+                        guess = input("Your guess: ")
+                    else:
+                        strategy.feedback(response_json['message'])
+                        guess = strategy.next_guess()
+                        print("Your guess:", guess)
+                    stream.send({"guess": guess})
+                    game_history.append(f"Client: {guess}")
+
+                # The session ticket has arrived by now, keep it for the next game
+                session_cache.put(server_host, server_port, context, client_socket.session)
+
+                # Game ended -> Compress (pickle and zlib)
+                session = make_session(game_history, f"{server_host}:{server_port}")
+                compress_and_save_history([session], 'client_history.log', 'client_history.pkl')
+                logging.info("Game session ended and history saved.")
+                return session['outcome']
+        # Various error handling
+        except socket.gaierror:
+            logging.error("GAI error.")
+        except ssl.SSLCertVerificationError as e:
+            logging.error(f"SSL Certificate Verification Failed: {e}")
+        except socket.timeout:
+            logging.error("Connection timed out.")
+        except ConnectionError as e:
+            logging.error(f"Unexpected disconnection. Closing game. {e}")
+        except ssl.SSLError as e:
+            logging.error(f"SSL error occurred: {e}")
+        except socket.error as e:
+            logging.error(f"Socket error occurred: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Connect to the number guessing game server.')
+    # Using -a option to specify CA certificate file to trust that cert file
+    parser.add_argument('-a', metavar='cafile', default=None)
+    # Using --history option to print the last N games before connecting
+    parser.add_argument('--history', metavar='N', type=int, default=0)
+    # Using --codec option to ask the server for the compact binary codec
+    parser.add_argument('--codec', choices=[JSON_CODEC, BINARY_CODEC], default=JSON_CODEC)
+    # Using --games option to play several games in a row, reconnecting with a resumed TLS session
+    parser.add_argument('--games', metavar='N', type=int, default=1)
+    # Using --bot option to play headless with a strategy; 'replay' plays the games in client_history.log again
+    parser.add_argument('--bot', choices=STRATEGIES, default=None)
+    args = parser.parse_args()
+    bot = None
+    if args.bot:
+        replay_games = None
+        if args.bot == 'replay':
+            try:
+                replay_games = [recorded_guesses(session['messages'])
+                                for session in iter_history('client_history.log', 'client_history.pkl', last=args.games)]
+            except FileNotFoundError:
+                parser.error("no client_history.log to replay; play some games first")
+            except ValueError as e:
+                parser.error(str(e))
+        try:
+            bot = make_strategy(args.bot, replay_games)
+        except ValueError as e:
+            parser.error(str(e))
+    for game_number in range(args.games):
+        guess_the_number_client('127.0.0.1', 65432, args.a, args.history if game_number == 0 else 0, args.codec,
+                                strategy=bot)
@@ -0,0 +1,320 @@
+import argparse
+import collections
+import datetime
+import os
+import pickle
+import struct
+import time
+import zlib
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no file locks, and no --workers sharing the log either
+    fcntl = None
+
+# Every history log starts with this magic so it can't be confused with the old single-blob pickle files
+LOG_MAGIC = b'GHLOG1\n'
+# Each record is (payload length, crc32 of payload), the zlib-compressed pickle of one session, then the same
+# header again as a trailer, so the last record can be found and checked from the end of the file
+RECORD_HEADER = struct.Struct('>II')
+
+# Logs whose tail was already checked for a torn write in this process
+_checked_logs = set()
+
+
+# Function to turn one session into a length-prefixed, independently compressed record
+def encode_record(session):
+    payload = zlib.compress(pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL))
+    header = RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+    return header + payload + header
+
+
+# Function to check from the end of the file that the last record is complete: its trailer gives its length,
+# so only that record is read however long the history is
+def _tail_is_valid(f, size):
+    if size == len(LOG_MAGIC):
+        return True
+    f.seek(max(size - RECORD_HEADER.size, 0))
+    trailer = f.read(RECORD_HEADER.size)
+    length, crc = RECORD_HEADER.unpack(trailer)
+    start = size - 2 * RECORD_HEADER.size - length
+    if start < len(LOG_MAGIC):
+        return False
+    f.seek(start)
+    if f.read(RECORD_HEADER.size) != trailer:
+        return False
+    return zlib.crc32(f.read(length)) == crc
+
+
+# Function to find where the last complete record ends, walking the headers from the start of the file.
+# Only needed after a crash left a torn record (see _tail_is_valid), and only the last record is checksummed.
+def _find_valid_end(f):
+    size = f.seek(0, os.SEEK_END)
+    offset = len(LOG_MAGIC)
+    last = None
+    while offset + 2 * RECORD_HEADER.size <= size:
+        f.seek(offset)
+        header = f.read(RECORD_HEADER.size)
+        length, crc = RECORD_HEADER.unpack(header)
+        end = offset + 2 * RECORD_HEADER.size + length
+        if end > size:
+            break
+        f.seek(end - RECORD_HEADER.size)
+        if f.read(RECORD_HEADER.size) != header:
+            break
+        last = (offset, length, crc)
+        offset = end
+    if last is not None:
+        start, length, crc = last
+        f.seek(start + RECORD_HEADER.size)
+        if zlib.crc32(f.read(length)) != crc:
+            return start
+    return offset
+
+
+# Function to open the log and lock it: shared to append (appends don't get in each other's way),
+# exclusive to recover it
+def _open_locked(filename, flags, exclusive=False):
+    fd = os.open(filename, flags)
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    return fd
+
+
+# Function to cut off a record that was only partially written when a process crashed.
+# Runs under the exclusive lock, so a record another process is still appending is never mistaken for a torn one.
+def _recover_tail(filename):
+    with os.fdopen(_open_locked(filename, os.O_RDWR, exclusive=True), 'rb+') as f:
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"{filename} is not a game history log.")
+        size = f.seek(0, os.SEEK_END)
+        if _tail_is_valid(f, size):
+            return
+        valid_end = _find_valid_end(f)
+        logging.warning(f"Discarding {size - valid_end} bytes of torn history record in {filename}.")
+        f.truncate(valid_end)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# Function to create an empty log, unless another process just did
+def _create_log(filename):
+    try:
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+    except FileExistsError:
+        return
+    try:
+        os.write(fd, LOG_MAGIC)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Function to write the records atomically as a new log file (write to temp file, fsync, then rename)
+def _write_new_log(filename, sessions):
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(LOG_MAGIC)
+        for session in sessions:
+            f.write(encode_record(session))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
+# Function to convert an old single-blob history (zlib + pickle of a list of sessions) into the record log.
+# Runs only when the log does not exist yet, so a crash half way through simply redoes it next time.
+# A file that can't be read is renamed to .corrupt, so it doesn't stop every save from then on.
+def migrate_legacy_history(filename, legacy_filename):
+    if os.path.exists(filename) or not legacy_filename or not os.path.exists(legacy_filename):
+        return False
+    with open(legacy_filename, 'rb') as f:
+        data = f.read()
+    try:
+        sessions = pickle.loads(zlib.decompress(data)) if data else []
+    except Exception as e:
+        os.replace(legacy_filename, legacy_filename + '.corrupt')
+        logging.warning(f"Could not read old history {legacy_filename} ({e}), renamed it to {legacy_filename}.corrupt.")
+        return False
+    _write_new_log(filename, sessions)
+    os.replace(legacy_filename, legacy_filename + '.migrated')
+    logging.info(f"Migrated {len(sessions)} sessions from {legacy_filename} to {filename}.")
+    return True
+
+
+# Function to append game sessions to the history log.
+# Each session is its own record, so a save costs O(session) no matter how long the history is.
+def compress_and_save_history(history, filename='game_history.log', legacy_filename='game_history.pkl'):
+    try:
+        migrate_legacy_history(filename, legacy_filename)
+        if not os.path.exists(filename):
+            logging.info("No existing history. Creating new history file.")
+            _create_log(filename)
+        if filename not in _checked_logs:
+            _recover_tail(filename)
+            _checked_logs.add(filename)
+
+        # Append all records with a single write, then fsync so a finished game survives a crash
+        data = b''.join(encode_record(session) for session in history)
+        fd = _open_locked(filename, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        logging.info("Game history saved successfully.")
+    except Exception as e:
+        logging.error(f"Failed to save history: {e}")
+
+
+# Function to wrap the messages of one game with the metadata the history reader filters on
+def make_session(messages, address=None, outcome=None):
+    return {
+        'time': time.time(),
+        'address': address,
+        'outcome': outcome or session_outcome(messages),
+        'messages': list(messages),
+    }
+
+
+# Function to work out how a game ended from its messages
+def session_outcome(messages):
+    for item in reversed(messages):
+        if "Congratulations" in item:
+            return 'win'
+        if "Sorry" in item:
+            return 'loss'
+    return 'incomplete'
+
+
+# Function to give old records (plain lists of messages, e.g. migrated from .pkl) the same shape as new ones
+def _normalize(session):
+    if isinstance(session, dict):
+        return session
+    return {'time': None, 'address': None, 'outcome': session_outcome(session), 'messages': session}
+
+
+# Function to walk the record headers of an open log, yielding (offset, length, crc) without reading payloads
+def _iter_headers(f, filename):
+    offset = f.seek(len(LOG_MAGIC))
+    while True:
+        header = f.read(RECORD_HEADER.size)
+        if not header:
+            return
+        if len(header) < RECORD_HEADER.size:
+            logging.warning(f"Ignoring torn history record at the end of {filename}.")
+            return
+        length, crc = RECORD_HEADER.unpack(header)
+        yield offset, length, crc
+        offset = f.seek(offset + 2 * RECORD_HEADER.size + length)
+
+
+# Function to read and decompress a single record, or None if it was torn by a crash
+def _read_record(f, filename, offset, length, crc):
+    f.seek(offset + RECORD_HEADER.size)
+    payload = f.read(length)
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        logging.warning(f"Ignoring torn history record at the end of {filename}.")
+        return None
+    return _normalize(pickle.loads(zlib.decompress(payload)))
+
+
+# Function to check one session against the reader's filters
+def _matches(session, since, until, address, outcome):
+    if outcome is not None and session['outcome'] != outcome:
+        return False
+    if address is not None and (session['address'] is None or str(address) not in str(session['address'])):
+        return False
+    if since is not None or until is not None:
+        if session['time'] is None:
+            return False
+        if since is not None and session['time'] < since:
+            return False
+        if until is not None and session['time'] > until:
+            return False
+    return True
+
+
+# Function to stream sessions from the log one record at a time, so memory stays at O(one session).
+# since/until are UNIX timestamps, address matches a substring of the peer address,
+# outcome is 'win', 'loss' or 'incomplete' and last keeps only the last N matching sessions.
+def iter_history(filename='game_history.log', legacy_filename='game_history.pkl',
+                 since=None, until=None, address=None, outcome=None, last=None):
+    migrate_legacy_history(filename, legacy_filename)
+    if last is not None and last <= 0:
+        return
+    with open(filename, 'rb') as f:
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"{filename} is not a game history log.")
+        filtered = any(value is not None for value in (since, until, address, outcome))
+
+        # Without other filters the last N sessions can be found from the headers alone,
+        # so only N records are ever decompressed.
+        if last is not None and not filtered:
+            headers = collections.deque(_iter_headers(f, filename), maxlen=last)
+            for header in headers:
+                session = _read_record(f, filename, *header)
+                if session is None:
+                    return
+                yield session
+            return
+
+        matched = collections.deque(maxlen=last)
+        for header in _iter_headers(f, filename):
+            session = _read_record(f, filename, *header)
+            if session is None:
+                break
+            if not _matches(session, since, until, address, outcome):
+                continue
+            if last is None:
+                yield session
+            else:
+                matched.append(session)
+        yield from matched
+
+
+# Function to show the last `limit` games of history (nothing when limit is 0)
+def load_and_display_history(filename='game_history.log', legacy_filename='game_history.pkl', limit=0, **filters):
+    if not limit:
+        return
+    try:
+        for session in iter_history(filename, legacy_filename, last=limit, **filters):
+            print_session(session)
+        logging.info("Loaded game history successfully.")
+    except FileNotFoundError:
+        logging.info("No previous game history found.")
+    except (ValueError, zlib.error, EOFError, pickle.UnpicklingError) as e:
+        logging.error(f"Error while loading or decompressing game history: {e}")
+
+
+# Function to print one session with its metadata
+def print_session(session):
+    when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(session['time'])) if session['time'] else 'unknown time'
+    print(f"--- {when} | {session['address'] or 'unknown address'} | {session['outcome']}")
+    for item in session['messages']:
+        print(item)
+
+
+# Function to turn an ISO date/time given on the command line into a UNIX timestamp
+def _timestamp(value):
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Browse the number guessing game history.')
+    parser.add_argument('filename', nargs='?', default='game_history.log')
+    parser.add_argument('--legacy', metavar='file', default=None, help='old single-blob .pkl file to migrate')
+    parser.add_argument('--since', type=_timestamp, default=None, help='ISO date/time, e.g. 2024-05-01T12:00')
+    parser.add_argument('--until', type=_timestamp, default=None, help='ISO date/time')
+    parser.add_argument('--address', default=None, help='only sessions whose peer address contains this')
+    parser.add_argument('--outcome', choices=['win', 'loss', 'incomplete'], default=None)
+    parser.add_argument('--last', type=int, default=None, help='only the last N matching sessions')
+    args = parser.parse_args()
+    try:
+        for entry in iter_history(args.filename, args.legacy, since=args.since, until=args.until,
+                                  address=args.address, outcome=args.outcome, last=args.last):
+            print_session(entry)
+    except FileNotFoundError:
+        logging.info("No previous game history found.")
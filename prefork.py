@@ -0,0 +1,127 @@
+import collections
+import logging
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+import time
+
+
+class Supervisor:
+    def __init__(self, target, workers, args=(), report_every=30, min_uptime=5, max_restart_delay=60,
+                 start_method='spawn'):
+        # Runs `workers` copies of target(worker_id, stats_queue, *args), each in its own process, and starts a new
+        # one whenever one exits. Workers send their counters over stats_queue (see report_stats) and the
+        # supervisor logs the totals every report_every seconds.
+        self.target = target
+        self.workers = workers
+        self.args = args
+        self.report_every = report_every
+        # A worker that crashes within min_uptime seconds of starting is restarted after a growing delay,
+        # so a worker that can't start (e.g. port in use) doesn't restart in a tight loop
+        self.min_uptime = min_uptime
+        self.max_restart_delay = max_restart_delay
+        # Workers are started fresh ('spawn') so they don't inherit this process's threads, sockets or SSL state.
+        # With 'fork' they share what was created before run() instead, e.g. one SSL context and so one session
+        # ticket key. The supervisor starts no threads of its own, so forking it again for a restart is safe too.
+        self.context = multiprocessing.get_context(start_method)
+        self.stats_queue = self.context.Queue()
+        self.processes = {}
+        self.started = {}
+        self.restart_delays = {}
+        self.restart_at = {}
+        self.stats = {}
+        self.retired = collections.Counter()  # Counters of workers that have exited
+        self.restarts = 0
+
+    def start_worker(self, worker_id):
+        process = self.context.Process(target=self.target, args=(worker_id, self.stats_queue) + tuple(self.args),
+                                       name=f"worker-{worker_id}")
+        process.start()
+        self.processes[worker_id] = process
+        self.started[worker_id] = time.monotonic()
+
+    def run(self):
+        for worker_id in range(self.workers):
+            self.start_worker(worker_id)
+        logging.info(f"Started {self.workers} worker processes.")
+        # Stopping the supervisor (Ctrl+C or SIGTERM) stops every worker with it
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        next_report = time.monotonic() + self.report_every
+        try:
+            while True:
+                self.collect_stats(timeout=1)
+                self.check_workers()
+                if time.monotonic() >= next_report:
+                    logging.info(f"Workers: {self.summary()}")
+                    next_report = time.monotonic() + self.report_every
+        finally:
+            for process in self.processes.values():
+                process.terminate()
+            for process in self.processes.values():
+                process.join()
+            self.collect_stats(timeout=0)
+            logging.info(f"Workers stopped: {self.summary()}")
+
+    def check_workers(self):
+        # Start a new process for every worker that has exited
+        now = time.monotonic()
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive() or process.exitcode is None:
+                continue
+            if worker_id not in self.restart_at:
+                self.retired.update(self.stats.pop(worker_id, {}))
+                delay = 0
+                if process.exitcode != 0:
+                    logging.warning(f"Worker {worker_id} exited with code {process.exitcode}.")
+                    if now - self.started[worker_id] < self.min_uptime:
+                        delay = min(max(self.restart_delays.get(worker_id, 0), 0.5) * 2, self.max_restart_delay)
+                self.restart_delays[worker_id] = delay
+                self.restart_at[worker_id] = now + delay
+            if now >= self.restart_at[worker_id]:
+                del self.restart_at[worker_id]
+                self.restarts += 1
+                self.start_worker(worker_id)
+
+    def collect_stats(self, timeout):
+        # Keep the latest counters of every worker; waits up to timeout seconds for the first report
+        try:
+            while True:
+                worker_id, stats = self.stats_queue.get(timeout=timeout)
+                self.stats[worker_id] = stats
+                timeout = 0
+        except (queue.Empty, OSError, ValueError):
+            # Nothing (more) to read, or the queue was closed while stopping
+            return
+
+    def totals(self):
+        # Counters summed over every worker, including workers that have exited since
+        totals = collections.Counter(self.retired)
+        for stats in self.stats.values():
+            totals.update(stats)
+        return dict(totals)
+
+    def summary(self):
+        totals = self.totals()
+        alive = sum(1 for process in self.processes.values() if process.is_alive())
+        counters = ", ".join(f"{name} {value}" for name, value in sorted(totals.items()))
+        return f"{alive}/{self.workers} alive, {self.restarts} restarts" + (f", {counters}" if counters else "")
+
+
+# Function to send a worker's counters to the supervisor every `interval` seconds from a background thread.
+# snapshot() returns a dictionary of numbers that only grow (e.g. handshakes, games), so totals can be summed.
+# Returns a function that sends them right away, for the worker's last report before it exits.
+def report_stats(stats_queue, worker_id, snapshot, interval=5):
+    def send():
+        try:
+            stats_queue.put((worker_id, snapshot()))
+        except Exception as e:
+            logging.error(f"Error reporting worker stats: {e}")
+
+    def report():
+        while True:
+            time.sleep(interval)
+            send()
+    threading.Thread(target=report, name='stats', daemon=True).start()
+    return send
@@ -1,171 +1,331 @@
-import socket
-import ssl
-import random
-import json
-import pickle
-import zlib
-import logging
-
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-
-# Function to show history of previous games
-def load_and_display_history(filename='game_history.pkl'):
-    try:
-        with open(filename, 'rb') as f:
-            data = zlib.decompress(f.read())
-            history = pickle.loads(data)
-            logging.info("Loaded game history successfully.")
-            for session in history:
-                for item in session:
-                    print(item)
-    except FileNotFoundError:
-        logging.info("No previous game history found.")
-    except (zlib.error, EOFError, pickle.UnpicklingError) as e:
-        logging.error(f"Error while loading or decompressing game history: {e}")
-
-
-# Function to return response according to relations between guess and answer
-def determine_response(guess, number):
-    if guess == number:
-        return "Congratulations, you did it!"
-    elif guess < number:
-        return "Hint: You guessed too small! Guess again: "
-    else:
-        return "Hint: You guessed too high! Guess again: "
-
-
-# Function to compress and save game history using pickle and zlib.
-def compress_and_save_history(history, filename='game_history.pkl'):
-    try:
-        existing_history = []
-        try:
-            with open(filename, 'rb+') as f:
-                data = f.read()
-                if data:
-                    existing_history = pickle.loads(zlib.decompress(data))
-        except FileNotFoundError:
-            logging.info("No existing history. Creating new history file.")
-        except (EOFError, pickle.UnpicklingError) as e:
-            logging.warning(f"Failed to load existing history: {e}")
-
-        # Extend(append) new history to existing_history
-        existing_history.extend(history)
-
-        # Write the new data to the server pickle file
-        with open(filename, 'wb') as f:
-            compressed_data = zlib.compress(pickle.dumps(existing_history))
-            f.write(compressed_data)
-        logging.info("Game history saved successfully.")
-    except Exception as e:
-        logging.error(f"Failed to save history: {e}")
-
-
-# Function for playing game in server
-def guess_the_number_server(host='127.0.0.1', port=65432):
-    # Load and display the history of all the msgs exchanged during previous games.
-    load_and_display_history()
-    try:
-        # Create default context of server
-        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-        # Use the certificate and pem file that I generated
-        context.load_cert_chain(certfile='cert.crt', keyfile='key.pem')
-
-        # Create socket as IPv4, TCP
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            sock.bind((host, port))
-            sock.listen()
-
-            # Wrap socket in SSL context to create server socket
-            with context.wrap_socket(sock, server_side=True) as server_socket:
-                logging.info(f"SSL server listening on {host}:{port}")
-
-                while True:
-                    try:
-                        # Client has connected to the server.
-                        connection, address = server_socket.accept()
-                        with connection:
-                            # Log : show the address of client
-                            logging.info(f"Connected by {address}")
-                            game_history = []
-
-                            # Client has sent 'start' msg.
-                            data = connection.recv(1024).decode('utf-8').strip()
-                            data_json = json.loads(data)
-                            game_history.append(f"Client: {data_json}")
-
-                            # Init for game
-                            number = random.randint(1, 10)
-                            attempts = 0
-                            msg = json.dumps({"message": "Guess a number between 1 to 10:"})
-                            connection.sendall(msg.encode('utf-8'))
-                            game_history.append(f"Server: {msg}")
-
-                            while True:
-                                data = connection.recv(1024).decode('utf-8').strip()
-                                game_history.append(f"Client: {data}")
-                                if not data:
-                                    raise ConnectionError("Unexpected disconnection from client.")
-
-                                try:
-                                    # Deserialize json data
-                                    data_json = json.loads(data)
-                                    guess = int(data_json['guess'])
-
-                                    # Guess was correctly given between 1 ~ 10
-                                    if 1 <= guess <= 10:
-                                        # Get corresponding response based on relations of guess and answer
-                                        response = determine_response(guess, number)
-                                        attempts += 1
-                                        # If maximum attempts (5) was reached
-                                        if attempts >= 5:
-                                            # If fifth guess was correct
-                                            if response.startswith("Congratulations"):
-                                                msg = json.dumps({"message": response})
-                                                connection.sendall(msg.encode('utf-8'))
-                                                game_history.append(f"Server: {msg}")
-                                                break
-                                            # Fifth guess was incorrect
-                                            response = "Sorry, you've used all of your attempts!"
-
-                                    # Guess was an OOB number
-                                    else:
-                                        response = "Number needs to be between 1 to 10! Guess again: "
-
-                                    msg = json.dumps({"message": response})
-                                    connection.sendall(msg.encode('utf-8'))
-                                    game_history.append(f"Server: {msg}")
-
-                                    if response.startswith("Congratulations") or "Sorry" in response:
-                                        break
-                                except (ValueError, KeyError):
-                                    msg = json.dumps({"message": "Please enter a valid number. Guess again: "})
-                                    connection.sendall(msg.encode('utf-8'))
-                                    game_history.append(f"Server: {msg}")
-
-                            # Game ended -> Compress (pickle and zlib)
-                            compress_and_save_history([game_history])
-                            logging.info("Game session ended and history saved.")
-                            break
-                    # Various error handling
-                    except socket.timeout:
-                        logging.error("Connection timed out. Closing connection.")
-                    except ConnectionError as e:
-                        logging.error(f"Unexpected disconnection. Closing game. {e}")
-                    except ssl.SSLError as e:
-                        logging.error(f"SSL error occurred: {e}")
-                    except socket.error as e:
-                        logging.error(f"Socket error occurred: {e}")
-                    finally:
-                        if 'connection' in locals():
-                            connection.close()
-                            logging.info("Connection closed.")
-                        break
-    except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
-
-
-if __name__ == "__main__":
-    guess_the_number_server()
+import argparse
+import asyncio
+import signal
+import socket
+import ssl
+import random
+import logging
+from framing import CODECS, JSON_CODEC, MessageStream, read_message, write_message
+from tls_sessions import HandshakeCounter, enable_session_tickets
+from game_history import compress_and_save_history, load_and_display_history, make_session
+from prefork import Supervisor, report_stats
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+# Function to return response according to relations between guess and answer
+def determine_response(guess, number):
+    if guess == number:
+        return "Congratulations, you did it!"
+    elif guess < number:
+        return "Hint: You guessed too small! Guess again: "
+    else:
+        return "Hint: You guessed too high! Guess again: "
+
+
+# Function to play one turn of the game. Shared by the blocking and the asyncio server.
+# Returns the response, the new number of attempts and whether the game is over.
+def play_turn(message, number, attempts, max_attempts=5):
+    try:
+        guess = int(message['guess'])
+    except (ValueError, KeyError, TypeError, OverflowError):
+        return "Please enter a valid number. Guess again: ", attempts, False
+
+    # Guess was an OOB number
+    if not 1 <= guess <= 10:
+        return "Number needs to be between 1 to 10! Guess again: ", attempts, False
+
+    # Get corresponding response based on relations of guess and answer
+    response = determine_response(guess, number)
+    attempts += 1
+    if response.startswith("Congratulations"):
+        return response, attempts, True
+    # If maximum attempts was reached and the last guess was incorrect
+    if attempts >= max_attempts:
+        return "Sorry, you've used all of your attempts!", attempts, True
+    return response, attempts, False
+
+
+# Function to pick the codec the client asked for in its first message, falling back to JSON
+def negotiate_codec(message):
+    codec = message.get('codec', JSON_CODEC)
+    return codec if codec in CODECS else JSON_CODEC
+
+
+# Function to create the server SSL context from the certificate and pem file that I generated.
+# Session tickets let reconnecting clients resume instead of paying for a full handshake.
+def create_server_context(certfile='cert.crt', keyfile='key.pem', num_tickets=2):
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+    return enable_session_tickets(context, num_tickets)
+
+
+# Function to get the counters a worker process reports to the supervisor (see run_worker)
+def worker_stats(handshake_stats, counters):
+    handshakes = handshake_stats.snapshot()
+    return {'handshakes_full': handshakes['full'], 'handshakes_resumed': handshakes['resumed'],
+            'games': counters['games']}
+
+
+# Function for playing game in server.
+# With reuse_port several processes can listen on the same port; stats_queue is set in worker processes (run_worker).
+# The server ends after one game unless keep_serving is set, in which case it plays with one client after the other.
+def guess_the_number_server(host='127.0.0.1', port=65432, history_limit=0, reuse_port=False, stats_queue=None,
+                            worker_id=0, keep_serving=False, context=None):
+    # Show the last few games only, so startup time doesn't grow with the history.
+    # Use `python game_history.py` to browse or filter the whole history.
+    load_and_display_history(limit=history_limit)
+    counters = {'games': 0}
+    send_stats = None
+    try:
+        # Create default context of server, unless the supervisor made one for every worker
+        context = context or create_server_context()
+        handshake_stats = HandshakeCounter(context)
+        if stats_queue is not None:
+            send_stats = report_stats(stats_queue, worker_id, lambda: worker_stats(handshake_stats, counters))
+
+        # Create socket as IPv4, TCP
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                # Every worker binds the same port and the kernel spreads new connections between them
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind((host, port))
+            sock.listen()
+
+            # Wrap socket in SSL context to create server socket
+            with context.wrap_socket(sock, server_side=True) as server_socket:
+                logging.info(f"SSL server listening on {host}:{port}")
+
+                while True:
+                    connection = None
+                    try:
+                        # Client has connected to the server.
+                        connection, address = server_socket.accept()
+                        with connection:
+                            # Log : show the address of client
+                            logging.info(f"Connected by {address}")
+                            handshake_stats.record(connection)
+                            game_history = []
+                            stream = MessageStream(connection)
+
+                            # Client has sent 'start' msg.
+                            data_json = stream.recv()
+                            if data_json is None:
+                                raise ConnectionError("Unexpected disconnection from client.")
+                            game_history.append(f"Client: {data_json}")
+                            # The client may ask for the compact binary codec in its 'start' msg
+                            stream.codec = negotiate_codec(data_json)
+
+                            # Init for game
+                            number = random.randint(1, 10)
+                            attempts = 0
+                            msg = {"message": "Guess a number between 1 to 10:"}
+                            stream.send(msg)
+                            game_history.append(f"Server: {msg}")
+
+                            while True:
+                                try:
+                                    data_json = stream.recv()
+                                except ValueError:
+                                    # Malformed JSON is answered like any other invalid guess
+                                    data_json = {}
+                                if data_json is None:
+                                    raise ConnectionError("Unexpected disconnection from client.")
+                                game_history.append(f"Client: {data_json}")
+
+                                response, attempts, finished = play_turn(data_json, number, attempts)
+                                msg = {"message": response}
+                                stream.send(msg)
+                                game_history.append(f"Server: {msg}")
+                                if finished:
+                                    break
+
+                            # Game ended -> Compress (pickle and zlib)
+                            compress_and_save_history([make_session(game_history, f"{address[0]}:{address[1]}")])
+                            counters['games'] += 1
+                            logging.info("Game session ended and history saved.")
+                            if not keep_serving:
+                                break
+                    # Various error handling
+                    except socket.timeout:
+                        logging.error("Connection timed out. Closing connection.")
+                    except ConnectionError as e:
+                        logging.error(f"Unexpected disconnection. Closing game. {e}")
+                    except ssl.SSLError as e:
+                        logging.error(f"SSL error occurred: {e}")
+                    except socket.error as e:
+                        logging.error(f"Socket error occurred: {e}")
+                    finally:
+                        if connection is not None:
+                            connection.close()
+                            logging.info("Connection closed.")
+                        if not keep_serving:
+                            break
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {e}")
+    finally:
+        if send_stats is not None:
+            send_stats()
+
+
+# Function to write finished games from the asyncio server to the history log.
+# Sessions queued while a save is running are written together, so a burst of games costs one fsync.
+async def history_writer(history_queue):
+    running = True
+    while running:
+        batch = [await history_queue.get()]
+        while not history_queue.empty():
+            batch.append(history_queue.get_nowait())
+        # None is the shutdown signal, sent after every connection has queued its history
+        if None in batch:
+            running = False
+            batch = [session for session in batch if session is not None]
+        if batch:
+            await asyncio.to_thread(compress_and_save_history, batch)
+
+
+# Function for playing one game on an asyncio connection, using the same protocol as the blocking server
+async def play_game_async(reader, writer, history_queue, idle_timeout, counters):
+    address = writer.get_extra_info('peername')
+    logging.info(f"Connected by {address}")
+    game_history = []
+    try:
+        # Client has sent 'start' msg.
+        data_json = await asyncio.wait_for(read_message(reader), idle_timeout)
+        if data_json is None:
+            raise ConnectionError("Unexpected disconnection from client.")
+        game_history.append(f"Client: {data_json}")
+        codec = negotiate_codec(data_json)
+
+        # Init for game
+        number = random.randint(1, 10)
+        attempts = 0
+        msg = {"message": "Guess a number between 1 to 10:"}
+        write_message(writer, msg, codec)
+        await writer.drain()
+        game_history.append(f"Server: {msg}")
+
+        while True:
+            try:
+                data_json = await asyncio.wait_for(read_message(reader), idle_timeout)
+            except ValueError:
+                # Malformed JSON is answered like any other invalid guess
+                data_json = {}
+            if data_json is None:
+                raise ConnectionError("Unexpected disconnection from client.")
+            game_history.append(f"Client: {data_json}")
+
+            response, attempts, finished = play_turn(data_json, number, attempts)
+            msg = {"message": response}
+            write_message(writer, msg, codec)
+            # Only wait for the socket when the client isn't reading fast enough
+            await writer.drain()
+            game_history.append(f"Server: {msg}")
+            if finished:
+                break
+        counters['games'] += 1
+        logging.info(f"Game session with {address} ended.")
+    # Various error handling
+    except asyncio.TimeoutError:
+        logging.error(f"Connection with {address} was idle for {idle_timeout} seconds. Closing connection.")
+    except asyncio.CancelledError:
+        logging.info(f"Server is shutting down. Closing connection with {address}.")
+    except (ConnectionError, ValueError) as e:
+        logging.error(f"Unexpected disconnection. Closing game. {e}")
+    except ssl.SSLError as e:
+        logging.error(f"SSL error occurred: {e}")
+    except OSError as e:
+        logging.error(f"Socket error occurred: {e}")
+    finally:
+        # Games cut short by a timeout, an error or shutdown are saved too
+        if game_history:
+            history_queue.put_nowait(make_session(game_history, f"{address[0]}:{address[1]}"))
+        writer.close()
+
+
+# Function for serving many games concurrently on one asyncio event loop.
+# SIGINT/SIGTERM stop accepting, give running games shutdown_grace seconds to finish, then flush the history.
+async def guess_the_number_server_async(host='127.0.0.1', port=65432, idle_timeout=60, shutdown_grace=5,
+                                        backlog=4096, reuse_port=False, stats_queue=None, worker_id=0, context=None):
+    context = context or create_server_context()
+    handshake_stats = HandshakeCounter(context)
+    counters = {'games': 0}
+    send_stats = None
+    if stats_queue is not None:
+        send_stats = report_stats(stats_queue, worker_id, lambda: worker_stats(handshake_stats, counters))
+    history_queue = asyncio.Queue()
+    writer_task = asyncio.create_task(history_writer(history_queue))
+    games = set()
+
+    async def handle_connection(reader, writer):
+        task = asyncio.current_task()
+        games.add(task)
+        handshake_stats.record(writer.get_extra_info('ssl_object'))
+        try:
+            await play_game_async(reader, writer, history_queue, idle_timeout, counters)
+        finally:
+            games.discard(task)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    server = await asyncio.start_server(handle_connection, host, port, ssl=context, backlog=backlog,
+                                        ssl_handshake_timeout=idle_timeout, reuse_port=reuse_port)
+    logging.info(f"SSL asyncio server listening on {host}:{port}")
+    try:
+        await stop.wait()
+    finally:
+        logging.info("Shutting down. No longer accepting connections.")
+        server.close()
+        if games:
+            logging.info(f"Waiting up to {shutdown_grace} seconds for {len(games)} running games.")
+            _, pending = await asyncio.wait(set(games), timeout=shutdown_grace)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await server.wait_closed()
+        history_queue.put_nowait(None)
+        await writer_task
+        logging.info("Pending game history flushed.")
+        logging.info(f"TLS handshakes: {handshake_stats.summary()}")
+        if send_stats is not None:
+            send_stats()
+
+
+# Function run by every worker process of --workers. Each worker binds the port with SO_REUSEPORT, so TLS handshakes
+# and games run on every core. The workers are forked with the supervisor's SSL context, so they all have the same
+# session ticket key and a client can resume its session with whichever worker it reaches next.
+def run_worker(worker_id, stats_queue, context, use_async, idle_timeout):
+    if use_async:
+        asyncio.run(guess_the_number_server_async(idle_timeout=idle_timeout, reuse_port=True,
+                                                  stats_queue=stats_queue, worker_id=worker_id, context=context))
+    else:
+        # Every worker keeps accepting clients; the supervisor only starts a worker again if it has died
+        guess_the_number_server(reuse_port=True, stats_queue=stats_queue, worker_id=worker_id, keep_serving=True,
+                                context=context)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the number guessing game server.')
+    # Using --history option to print the last N games before listening
+    parser.add_argument('--history', metavar='N', type=int, default=0)
+    # Using --async option to serve many games at once on an asyncio event loop
+    parser.add_argument('--async', dest='use_async', action='store_true')
+    parser.add_argument('--idle-timeout', metavar='seconds', type=float, default=60)
+    # Using --workers option to pre-fork several server processes on the same port (SO_REUSEPORT);
+    # workers that die are started again and their counters are summed in the log
+    parser.add_argument('--workers', metavar='N', type=int, default=1)
+    args = parser.parse_args()
+    if args.workers > 1:
+        load_and_display_history(limit=args.history)
+        Supervisor(run_worker, args.workers, (create_server_context(), args.use_async, args.idle_timeout),
+                   start_method='fork').run()
+    elif args.use_async:
+        load_and_display_history(limit=args.history)
+        asyncio.run(guess_the_number_server_async(idle_timeout=args.idle_timeout))
+    else:
+        guess_the_number_server(history_limit=args.history)
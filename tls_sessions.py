@@ -0,0 +1,95 @@
+import collections
+import logging
+import ssl
+import threading
+import time
+
+
+class SessionCache:
+    def __init__(self, max_size=128, max_age=3600):
+        # Client-side cache of TLS sessions, so reconnecting to a server resumes instead of doing a full handshake.
+        # Bounded to max_size servers (least recently used are dropped) and to max_age seconds per session.
+        self.max_size = max_size
+        self.max_age = max_age
+        self.sessions = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, host, port, context):
+        # Return a session to resume for (host, port), or None for a full handshake.
+        # A session can only be resumed with the SSLContext that created it.
+        with self.lock:
+            entry = self.sessions.get((host, port))
+            if entry is None:
+                return None
+            entry_context, session = entry
+            if entry_context is not context or self._expired(session):
+                del self.sessions[(host, port)]
+                return None
+            self.sessions.move_to_end((host, port))
+            return session
+
+    def put(self, host, port, context, session):
+        # Remember the session of a connection. With TLS 1.3 the ticket arrives after the handshake,
+        # so call this after something has been received from the server.
+        if session is None:
+            return
+        with self.lock:
+            self.sessions[(host, port)] = (context, session)
+            self.sessions.move_to_end((host, port))
+            while len(self.sessions) > self.max_size:
+                self.sessions.popitem(last=False)
+
+    def _expired(self, session):
+        # Expire by the lifetime the server gave the session and by our own max_age, whichever is shorter
+        lifetime = min(session.timeout, self.max_age) if session.timeout else self.max_age
+        return time.time() > session.time + lifetime
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class HandshakeCounter:
+    def __init__(self, context=None, report_every=100):
+        # Server-side counters of full vs. resumed handshakes, to check the session resumption hit rate
+        self.context = context
+        self.report_every = report_every
+        self.full = 0
+        self.resumed = 0
+        self.lock = threading.Lock()
+
+    def record(self, ssl_object):
+        # Count one finished handshake (ssl_object is an SSLSocket or SSLObject)
+        with self.lock:
+            if ssl_object is not None and ssl_object.session_reused:
+                self.resumed += 1
+            else:
+                self.full += 1
+            total = self.full + self.resumed
+        if self.report_every and total % self.report_every == 0:
+            logging.info(f"TLS handshakes: {self.summary()}")
+
+    def snapshot(self):
+        # Counters as a dictionary, together with OpenSSL's own session statistics when a context is known
+        with self.lock:
+            total = self.full + self.resumed
+            stats = {
+                'full': self.full,
+                'resumed': self.resumed,
+                'hit_rate': round(self.resumed / total, 3) if total else None,
+            }
+        if self.context is not None:
+            stats['openssl'] = self.context.session_stats()
+        return stats
+
+    def summary(self):
+        stats = self.snapshot()
+        return f"{stats['full']} full, {stats['resumed']} resumed (hit rate {stats['hit_rate']})"
+
+
+# Function to turn on session tickets for a server context.
+# Python's ssl module doesn't expose OpenSSL's server-side cache size or timeout, so resumption relies on
+# stateless tickets: the server keeps no per-session state and the client cache above bounds size and age.
+def enable_session_tickets(context, num_tickets=2):
+    context.options &= ~ssl.OP_NO_TICKET
+    context.num_tickets = num_tickets
+    return context